@@ -3,15 +3,14 @@ from __future__ import annotations
 # python imports:
 from abc import ABCMeta, abstractmethod
 import logging
-import re
 from types import TracebackType
 from typing import (
-	Callable, Generator, Generic, Iterator, Optional as Opt, Sequence as Seq,
-	Tuple, Type, TypeVar, Union,
+	Any, Callable, Generator, Generic, Iterable, Iterator, List, Optional as Opt,
+	Sequence as Seq, Tuple, Type, TypeVar, Union,
 )
 
 # email_proto imports:
-from util import bytes_types, BYTES, b2s, s2b
+from util import bytes_types, BYTES, b2s
 
 logger = logging.getLogger ( __name__ )
 
@@ -20,18 +19,27 @@ EXC_INFO = Opt[Union[
 	Tuple[None,None,None],
 ]]
 
-_r_eol = re.compile ( r'[\r\n]' )
+
+class _ReprPrefix:
+	# reprs get built for every event when debug logging is on, so
+	# work out each class's 'module.Name' once instead of on every call
+	_repr_prefix: str
+	
+	def __init_subclass__ ( cls, **kwargs: Any ) -> None:
+		super().__init_subclass__ ( **kwargs )
+		cls._repr_prefix = f'{cls.__module__}.{cls.__name__}'
 
 
-class Event ( Exception ):
+class Event ( Exception, _ReprPrefix ):
+	# no __slots__: BaseException instances always carry a __dict__ anyway
 	exc_info: EXC_INFO = None
+	_flush_first: bool = True # see ServerProtocol.receive()
 	
 	def go ( self ) -> Iterator[Event]:
 		yield self
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}()'
+		return f'{self._repr_prefix}()'
 
 
 class Closed ( Exception ): # TODO FIXME: BaseException?
@@ -44,7 +52,7 @@ class ProtocolError ( Exception ):
 
 
 ResponseType = TypeVar ( 'ResponseType', bound = 'BaseResponse' )
-class BaseResponse ( Exception, metaclass = ABCMeta ):
+class BaseResponse ( Exception, _ReprPrefix, metaclass = ABCMeta ):
 	@abstractmethod
 	def is_success ( self ) -> bool:
 		cls = self.__class__
@@ -54,19 +62,20 @@ class BaseResponse ( Exception, metaclass = ABCMeta ):
 RequestProtocolGenerator = Generator[Event,None,None]
 
 
-class BaseRequest ( metaclass = ABCMeta ):
+class BaseRequest ( _ReprPrefix, metaclass = ABCMeta ):
 	# this class is the basis of all client/server command handling
 	# 1) client uses __init__() to construct request
 	# 2) server bypasses __init__() for technical reasons
 	# 3) _client_protocol() implements client-side state machine
 	# 4) _server_protocol() implements server-side state machine
+	# ( no __slots__: #2 relies on class-level defaults like base_response )
 	tls_required: bool = False
 	tls_excluded: bool = False
+	ends_batch: bool = False # see ServerProtocol.receive()
 	base_response: Opt[BaseResponse] = None
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}()'
+		return f'{self._repr_prefix}()'
 	
 	@abstractmethod
 	def _client_protocol ( self, client: ClientProtocol ) -> RequestProtocolGenerator:
@@ -90,7 +99,7 @@ RequestType = RequestT[ResponseType]
 
 
 class NeedDataEvent ( Event ):
-	data: Opt[bytes] = None
+	data: Opt[BYTES] = None # bytes, or a memoryview into the receive buffer if the read had a bare CR
 	response: Opt[BaseResponse] = None
 	
 	def reset ( self ) -> NeedDataEvent:
@@ -99,8 +108,7 @@ class NeedDataEvent ( Event ):
 		return self
 	
 	def go ( self ) -> Iterator[Event]:
-		self.reset()
-		yield from super().go()
+		yield self.reset()
 
 
 class SendDataEvent ( Event ):
@@ -109,12 +117,17 @@ class SendDataEvent ( Event ):
 		self.chunks: Seq[bytes] = chunks
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}(chunks={self.chunks!r})'
+		return f'{self._repr_prefix}(chunks={self.chunks!r})'
+
 
+# _run_protocol() runs for every command, so look its logger up once
+# rather than taking the logging lock in getChild() each time
+_run_protocol_log = logger.getChild ( 'Client._run_protocol' )
 
 class Protocol ( metaclass = ABCMeta ):
+	# no __slots__: most state lives in the class-level defaults below until first assigned
 	_buf: bytes = b''
+	_buf_scanned: int = 0 # leading bytes of _buf already known not to contain a b'\n'
 	request: Opt[BaseRequest] = None
 	request_protocol: Opt[Generator[Event,None,None]] = None
 	need_data: Opt[NeedDataEvent] = None
@@ -129,48 +142,100 @@ class Protocol ( metaclass = ABCMeta ):
 		assert isinstance ( data, bytes_types ), f'invalid {data=}'
 		if not data: # EOF indicator
 			if self._buf:
-				buf, self._buf = self._buf, b''
+				buf, self._buf, self._buf_scanned = self._buf, b'', 0
 				yield from self._receive_line ( buf )
 				return
 			raise Closed ( 'EOF' )
+		# don't rescan a partial line every time another piece of it arrives. only that
+		# partial line is ever carried over and it's capped at _MAXLINE, so buffering stays linear
+		scan = self._buf_scanned
 		self._buf += data
+		buf = self._buf
+		if buf.find ( b'\n', scan ) < 0:
+			lines: Iterable[BYTES] = ()
+		elif buf.count ( b'\r' ) == buf.count ( b'\r\n' ):
+			# splitlines() does the whole read in one C-level pass, but it also breaks on a bare
+			# CR, so it's only usable when every CR is part of a CRLF ( the overwhelming case )
+			lines = buf.splitlines ( True )
+			if lines[-1][-1:] != b'\n':
+				lines.pop() # partial line, stays buffered
+		else:
+			lines = self._split_lf ( buf )
 		start = 0
-		end = 0
 		try:
-			while ( end := ( self._buf.find ( b'\n', start ) + 1 ) ):
-				line = memoryview ( self._buf )[start:end]
-				start = end
-				yield from self._receive_line ( line )
+			for line in lines:
+				start += len ( line )
+				if self.need_data is None:
+					yield from self._receive_line ( line )
+					continue
+				# a request protocol is waiting for this line ( typically a DATA body line )
+				# so feed it directly, only spinning up _run_protocol() if something comes of it
+				self.need_data.data = line
+				self.need_data = None
+				try:
+					event = self._advance()
+				except Exception as e:
+					yield from self._run_protocol ( exc = e )
+				else:
+					if event is not None:
+						yield from self._run_protocol ( event )
 		finally:
 			if start:
 				self._buf = self._buf[start:]
+				self._buf_scanned = 0 # in case we were interrupted with complete lines still buffered
+		self._buf_scanned = len ( self._buf )
 		if len ( self._buf ) >= self._MAXLINE:
 			raise ProtocolError ( 'maximum line length exceeded' )
 	
+	@staticmethod
+	def _split_lf ( buf: bytes ) -> Iterator[memoryview]:
+		# complete lines of buf, ending only at LF. unlike the splitlines() path these are views
+		# of buf that can outlive receive(), which is why _buf stays immutable bytes rather than a bytearray
+		view = memoryview ( buf )
+		start = 0
+		while ( end := ( buf.find ( b'\n', start ) + 1 ) ):
+			yield view[start:end]
+			start = end
+	
 	@abstractmethod
-	def _receive_line ( self, line: bytes ) -> Iterator[Event]:
+	def _receive_line ( self, line: BYTES ) -> Iterator[Event]:
 		cls = type ( self )
 		raise NotImplementedError ( f'{cls.__module__}.{cls.__name__}._receive_line()' )
 	
-	def _run_protocol ( self ) -> Iterator[Event]:
-		log = logger.getChild ( 'Client._run_protocol' )
+	def _advance ( self ) -> Opt[Event]:
+		# runs the request protocol up to its next event. a NeedDataEvent is kept
+		# here ( in need_data ) and None returned, there's nothing to pass upstack
 		assert self.request is not None, f'invalid {self.request=}'
 		assert self.request_protocol is not None, f'invalid {self.request_protocol=}'
+		event = next ( self.request_protocol )
+		if not isinstance ( event, NeedDataEvent ):
+			return event
+		if self.request.base_response is not None:
+			log = _run_protocol_log
+			log.warning ( f'INTERNAL ERROR - {self.request!r} pushed NeedDataEvent but has a response set - this can cause upstack deadlock ({self.request.base_response!r})' )
+			self.request.base_response = None
+		self.need_data = event.reset()
+		return None
+	
+	def _run_protocol ( self, event: Opt[Event] = None, exc: Opt[Exception] = None ) -> Iterator[Event]:
+		# event/exc are what receive() already got out of _advance(), if anything
+		log = _run_protocol_log
+		debug = log.isEnabledFor ( logging.DEBUG ) # don't build event reprs nobody will see
 		try:
+			if exc is not None:
+				raise exc
 			while True:
-				log.debug ( 'yielding to request protocol' )
-				event = next ( self.request_protocol )
-				log.debug ( f'{event=}' )
-				if isinstance ( event, NeedDataEvent ):
-					if self.request.base_response is not None:
-						log.warning ( f'INTERNAL ERROR - {self.request!r} pushed NeedDataEvent but has a response set - this can cause upstack deadlock ({self.request.base_response!r})' )
-						self.request.base_response = None
-					self.need_data = event.reset()
-					return
-				else:
-					yield event
-					if event.exc_info:
-						self.request_protocol.throw ( *event.exc_info )
+				if event is None:
+					event = self._advance()
+					if event is None:
+						return
+				if debug:
+					log.debug ( f'{event=}' )
+				yield event
+				if event.exc_info:
+					assert self.request_protocol is not None
+					self.request_protocol.throw ( *event.exc_info )
+				event = None
 		except Closed as e:
 			#log.debug ( f'protocol indicated connection closure: {e=}' )
 			self.request = None
@@ -196,6 +261,7 @@ class Protocol ( metaclass = ABCMeta ):
 			# if not, the smtp_[a]sync.Client._recv() will get stuck waiting for data that never arrives
 			request, self.request = self.request, None
 			self.request_protocol = None
+			assert request is not None
 			if not request.base_response and isinstance ( self, ClientProtocol ):
 				log.warning (
 					f'INTERNAL ERROR:'
@@ -232,9 +298,14 @@ class ClientProtocol ( Protocol ):
 class ServerProtocol ( Protocol ):
 	pedantic: bool = True # set this to False to relax behaviors that cause no harm for the protocol
 	auth_uid: Opt[str] = None
+	_MAXBATCH: int = 4096 # flush coalesced responses once this many bytes are pending ( 0 disables coalescing )
+	_unbatched: bool = False # current request's replies must not be held back
 	
 	def __init__ ( self, tls: bool, hostname: str ) -> None:
-		assert isinstance ( hostname, str ) and not _r_eol.search ( hostname ), f'invalid {hostname=}'
+		assert isinstance ( hostname, str ), f'invalid {hostname=}'
+		# it goes out verbatim in the greeting, so don't let python -O strip this one:
+		if '\r' in hostname or '\n' in hostname or '\0' in hostname:
+			raise ValueError ( f'invalid {hostname=}' )
 		self.hostname = hostname
 		super().__init__ ( tls )
 		self.reset()
@@ -246,6 +317,62 @@ class ServerProtocol ( Protocol ):
 		# override this if server protocol needs to say "hi" first
 		yield from ()
 	
+	def receive ( self, data: bytes ) -> Iterator[Event]:
+		# RFC2920#3.1 coalesce the responses to pipelined commands into as few writes as possible.
+		# pending responses are flushed ahead of any event whose handler may touch the connection
+		# ( the STARTTLS response must go out before the TLS handshake begins, etc ), events that
+		# only ask the application for a decision clear _flush_first so they don't split a batch.
+		# RFC2920#3.1 replies to commands that end a group ( Request.ends_batch, and unknown
+		# verbs ) go out on their own, after whatever was already pending
+		pending: List[SendDataEvent] = []
+		size = 0
+		try:
+			for event in super().receive ( data ):
+				if isinstance ( event, SendDataEvent ):
+					if self._unbatched:
+						if pending:
+							yield from self._flush ( pending )
+							size = 0
+						yield from self._flush ( [ event ] )
+						continue
+					pending.append ( event )
+					size += sum ( map ( len, event.chunks ) )
+					if size >= self._MAXBATCH:
+						yield from self._flush ( pending )
+						size = 0
+				else:
+					if pending and event._flush_first:
+						yield from self._flush ( pending )
+						size = 0
+					yield event
+		except Exception:
+			if pending: # make sure the response to QUIT, etc gets sent
+				yield from self._flush ( pending )
+			raise
+		if pending:
+			yield from self._flush ( pending )
+	
+	def _flush ( self, pending: List[SendDataEvent] ) -> Iterator[Event]:
+		if len ( pending ) == 1:
+			event = pending[0]
+		else:
+			event = SendDataEvent ( b''.join ( [ chunk for e in pending for chunk in e.chunks ] ) )
+		pending.clear()
+		yield event
+		if event.exc_info: # too late to throw this into the request protocol
+			raise Closed ( repr ( event.exc_info[1] ) ) from event.exc_info[1]
+	
+	@staticmethod
+	def _split_request_line ( line: BYTES ) -> Tuple[bytes,bytes]:
+		# returns the upper-cased verb and the still-encoded argument text ( both empty for a blank line )
+		parts = bytes ( line ).split ( None, 1 )
+		if not parts:
+			return b'', b''
+		verb = parts[0]
+		if not verb.isupper(): # clients almost always send upper-case verbs, so skip the copy
+			verb = verb.upper()
+		return verb, ( parts[1].rstrip() if len ( parts ) > 1 else b'' )
+	
 	@abstractmethod
 	def _parse_request_line ( self, line: BYTES ) -> Tuple[str,Opt[Type[BaseRequest]],str]:
 		cls = type ( self )
@@ -273,12 +400,15 @@ class ServerProtocol ( Protocol ):
 			self.need_data = None
 			yield from self._run_protocol()
 		else:
-			assert self.request is None, 'server internal state error - not waiting for data but a request is active'
+			if self.request is not None: # carrying on here would corrupt the session
+				raise RuntimeError ( 'server internal state error - not waiting for data but a request is active' )
+			self._unbatched = True # until we know the verb
 			try:
 				prefix, requestcls, suffix = self._parse_request_line ( line )
 			except SendDataEvent as e:
 				yield e
 				return
+			self._unbatched = requestcls is None or requestcls.ends_batch
 			if requestcls is None:
 				yield self._error_invalid_command()
 				return
@@ -304,29 +434,51 @@ class ClientUtil:
 	
 	def send ( self, line: str ) -> Iterator[Event]:
 		assert line.endswith ( '\r\n' ), f'invalid {line=}'
-		yield from ( event := SendDataEvent ( s2b ( line ) ) ).go()
+		yield SendDataEvent ( line.encode ( 'us-ascii' ) ) # go() would only add a generator frame
 
 	def recv_ok ( self, event: Opt[NeedDataEvent] = None ) -> Iterator[Event]:
 		if event is None:
 			event = NeedDataEvent()
-		yield from event.reset().go()
+		yield event.reset()
 		event.response = response = self.parser ( event.data or b'' )
 		if not response.is_success():
 			raise response
 
-	def recv_done ( self ) -> Iterator[Event]:
-		log = logger.getChild ( 'recv_done' )
-		yield from ( event := NeedDataEvent() ).go()
+	def recv_done ( self, event: Opt[NeedDataEvent] = None ) -> Iterator[Event]:
+		#log = logger.getChild ( 'recv_done' )
+		if event is None:
+			event = NeedDataEvent()
+		yield event.reset()
 		response = self.parser ( event.data or b'' )
 		raise response
 
-	def send_recv_ok ( self, line: str, event: Opt[NeedDataEvent] = None ) -> Iterator[Event]:
-		log = logger.getChild ( 'send_recv_ok' )
-		yield from self.send ( line )
-		yield from self.recv_ok ( event )
+	# the combined helpers below run on every command, so they're flattened into a
+	# single generator instead of delegating to send() and recv_*() and their go()s,
+	# and they take fixed commands ( b'QUIT\r\n' etc ) already encoded
+	
+	def send_recv_ok ( self, line: Union[str,bytes], event: Opt[NeedDataEvent] = None ) -> Iterator[Event]:
+		#log = logger.getChild ( 'send_recv_ok' )
+		data = line if isinstance ( line, bytes ) else line.encode ( 'us-ascii' )
+		assert data.endswith ( b'\r\n' ), f'invalid {line=}'
+		yield SendDataEvent ( data )
+		if event is None:
+			event = NeedDataEvent()
+		else:
+			event.reset()
+		yield event
+		event.response = response = self.parser ( event.data or b'' )
+		if not response.is_success():
+			raise response
 
-	def send_recv_done ( self, line: str ) -> Iterator[Event]:
-		yield from self.send ( line )
-		yield from self.recv_done()
+	def send_recv_done ( self, line: Union[str,bytes], event: Opt[NeedDataEvent] = None ) -> Iterator[Event]:
+		data = line if isinstance ( line, bytes ) else line.encode ( 'us-ascii' )
+		assert data.endswith ( b'\r\n' ), f'invalid {line=}'
+		yield SendDataEvent ( data )
+		if event is None:
+			event = NeedDataEvent()
+		else:
+			event.reset()
+		yield event
+		raise self.parser ( event.data or b'' )
 
 #endregion client protocol helpers
@@ -7,7 +7,7 @@ import logging
 import sys
 from types import TracebackType
 from typing import (
-	Generic, Iterator, Optional as Opt, Sequence as Seq, Tuple, Type, TypeVar,
+	Dict, Generic, Iterator, Optional as Opt, Sequence as Seq, Tuple, Type, TypeVar,
 	Union,
 )
 
@@ -23,6 +23,20 @@ logger = logging.getLogger ( __name__ )
 
 T = TypeVar ( 'T' )
 
+# event type -> handler method name, so dispatching an event is a dict hit
+# instead of formatting 'on_<name>' all over again for every single one
+_handler_names: Dict[Type[Event],str] = {}
+
+def _handler_name ( event: Event ) -> str:
+	cls = type ( event )
+	try:
+		return _handler_names[cls]
+	except KeyError:
+		name = _handler_names[cls] = f'on_{cls.__name__}'
+		return name
+
+_on_send_data_log = logger.getChild ( 'Client.on_SendDataEvent' )
+
 
 @contextlib.contextmanager
 def _event_exception_safety ( event: Event ) -> Iterator[None]:
@@ -35,15 +49,21 @@ class SyncEventHandler:
 	transport: SyncTransport
 	
 	def on_SendDataEvent ( self, event: SendDataEvent ) -> None:
-		log = logger.getChild ( 'Client.on_SendDataEvent' )
-		for chunk in event.chunks:
-			log.debug ( f'S>{b2s(chunk).rstrip()}' )
-			self.transport.write ( chunk )
+		log = _on_send_data_log
+		debug = log.isEnabledFor ( logging.DEBUG ) # chunks can be entire ( 8bit ) message bodies
+		if debug:
+			for chunk in event.chunks:
+				log.debug ( f'S>{b2s(chunk,"us-ascii","replace").rstrip()}' )
+		writelines = getattr ( self.transport, 'writelines', None ) # one drain/flush for all of an event's chunks
+		if writelines is None: # duck-typed transport that only implements write()
+			self.transport.write ( b''.join ( event.chunks ) )
+		else:
+			writelines ( event.chunks )
 	
 	def _on_event ( self, event: Event ) -> None:
-		log = logger.getChild ( 'SyncEventHandler._on_event' )
+		#log = logger.getChild ( 'SyncEventHandler._on_event' )
 		with _event_exception_safety ( event ):
-			func = getattr ( self, f'on_{type(event).__name__}' )
+			func = getattr ( self, _handler_name ( event ) )
 			func ( event )
 	
 	def close ( self ) -> None:
@@ -54,15 +74,21 @@ class AsyncEventHandler:
 	transport: AsyncTransport
 	
 	async def on_SendDataEvent ( self, event: SendDataEvent ) -> None:
-		log = logger.getChild ( 'Client.on_SendDataEvent' )
-		for chunk in event.chunks:
-			log.debug ( f'S>{b2s(chunk).rstrip()}' )
-			await self.transport.write ( chunk )
+		log = _on_send_data_log
+		debug = log.isEnabledFor ( logging.DEBUG ) # chunks can be entire ( 8bit ) message bodies
+		if debug:
+			for chunk in event.chunks:
+				log.debug ( f'S>{b2s(chunk,"us-ascii","replace").rstrip()}' )
+		writelines = getattr ( self.transport, 'writelines', None ) # one drain/flush for all of an event's chunks
+		if writelines is None: # duck-typed transport that only implements write()
+			await self.transport.write ( b''.join ( event.chunks ) )
+		else:
+			await writelines ( event.chunks )
 	
 	async def _on_event ( self, event: Event ) -> None:
-		log = logger.getChild ( 'AsyncEventHandler._on_event' )
+		#log = logger.getChild ( 'AsyncEventHandler._on_event' )
 		with _event_exception_safety ( event ):
-			func = getattr ( self, f'on_{type(event).__name__}' )
+			func = getattr ( self, _handler_name ( event ) )
 			await func ( event )
 	
 	async def close ( self ) -> None:
@@ -86,11 +112,13 @@ class SyncClient ( SyncEventHandler, Client ):
 	
 	def _request ( self, request: RequestType[ResponseType] ) -> ResponseType:
 		log = logger.getChild ( 'Client._request' )
+		debug = log.isEnabledFor ( logging.DEBUG )
 		for event in self.proto.send ( request ):
 			self._on_event ( event )
 		while not request.base_response:
 			data: bytes = self.transport.read()
-			log.debug ( f'S>{b2s(data).rstrip()}' )
+			if debug:
+				log.debug ( f'S>{b2s(data,"us-ascii","replace").rstrip()}' )
 			for event in self.proto.receive ( data ):
 				self._on_event ( event )
 		assert (
@@ -113,11 +141,13 @@ class AsyncClient ( AsyncEventHandler, Client ):
 	
 	async def _request ( self, request: RequestType[ResponseType] ) -> ResponseType:
 		log = logger.getChild ( 'Client._request' )
+		debug = log.isEnabledFor ( logging.DEBUG )
 		for event in self.proto.send ( request ):
 			await self._on_event ( event )
 		while not request.base_response:
 			data: bytes = await self.transport.read()
-			log.debug ( f'S>{b2s(data).rstrip()}' )
+			if debug:
+				log.debug ( f'S>{b2s(data,"us-ascii","replace").rstrip()}' )
 			for event in self.proto.receive ( data ):
 				await self._on_event ( event )
 		assert (
@@ -152,6 +182,7 @@ class SyncServer ( SyncEventHandler, Server ):
 	
 	def run ( self ) -> None:
 		log = logger.getChild ( 'SyncServer.run' )
+		debug = log.isEnabledFor ( logging.DEBUG ) # a DATA phase can stream megabytes through here
 		try:
 			for event in self.proto.startup():
 				self._on_event ( event )
@@ -159,7 +190,8 @@ class SyncServer ( SyncEventHandler, Server ):
 			while True:
 				with close_if_oserror():
 					data = self.transport.read()
-				log.debug ( f'C>{b2s(data).rstrip()}' )
+				if debug:
+					log.debug ( f'C>{b2s(data,"us-ascii","replace").rstrip()}' )
 				for event in self.proto.receive ( data ):
 					self._on_event ( event )
 		except Closed as e:
@@ -179,6 +211,7 @@ class AsyncServer ( AsyncEventHandler, Server ):
 	
 	async def run ( self ) -> None:
 		log = logger.getChild ( 'AsyncServer.run' )
+		debug = log.isEnabledFor ( logging.DEBUG ) # a DATA phase can stream megabytes through here
 		try:
 			for event in self.proto.startup():
 				await self._on_event ( event )
@@ -186,7 +219,8 @@ class AsyncServer ( AsyncEventHandler, Server ):
 			while True:
 				with close_if_oserror():
 					data = await self.transport.read()
-				log.debug ( f'C>{b2s(data).rstrip()}' )
+				if debug:
+					log.debug ( f'C>{b2s(data,"us-ascii","replace").rstrip()}' )
 				for event in self.proto.receive ( data ):
 					await self._on_event ( event )
 		except Closed as e:
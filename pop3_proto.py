@@ -7,7 +7,6 @@ import base64
 import email.utils
 import hashlib
 import logging
-import re
 import traceback
 from types import TracebackType
 from typing import (
@@ -26,11 +25,6 @@ from util import bytes_types, BYTES, b2s, s2b, b64_encode_str, b64_decode_str
 
 logger = logging.getLogger ( __name__ )
 
-
-_r_eol = re.compile ( r'[\r\n]' )
-_r_crlf_dot = re.compile ( b'\\r\\n\\.', re.M )
-
-
 #endregion
 #region RESPONSES -------------------------------------------------------------
 
@@ -45,19 +39,20 @@ class Response ( BaseResponse ):
 		#log = logger.getChild ( 'Response.parse' )
 		assert isinstance ( line, bytes_types ) and len ( line ) > 0, f'invalid {line=}'
 		try:
-			ok, *extra = b2s ( line ).split ( ' ', 1 )
-			assert ok in ( '+OK', '-ERR' ), f'invalid {ok=}'
+			# rstrip first so a bare '+OK\r\n' still yields ok='+OK'
+			ok, _, text = b2s ( line ).rstrip().partition ( ' ' ) # fixed 3-tuple, no list to build
 		except Exception as e:
 			raise Closed ( f'malformed response from server {line=}: {e=}' ) from e
-		text = extra[0].rstrip() if extra else ''
+		# this validates what the peer sent us, so it can't be an assert ( python -O would strip it )
+		if ok not in ( '+OK', '-ERR' ):
+			raise Closed ( f'malformed response from server {line=}: invalid {ok=}' )
 		if ok == '+OK':
 			return SuccessResponse ( text )
 		else:
 			return ErrorResponse ( text )
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}({self.ok!r}, {self.message!r})'
+		return f'{self._repr_prefix}({self.ok!r}, {self.message!r})'
 
 
 class SuccessResponse ( Response ):
@@ -78,13 +73,14 @@ class GreetingResponse ( SuccessResponse ):
 	apop_challenge: Opt[str]
 	
 	def __init__ ( self, message: str ) -> None:
-		m = re.search ( r'(<.*>)', message )
-		self.apop_challenge = m.group ( 1 ) if m else None
+		# RFC1939#7 the challenge is the greeting's <...> timestamp ( first '<' through last '>' )
+		start = message.find ( '<' )
+		end = message.rfind ( '>' )
+		self.apop_challenge = message[start:end + 1] if 0 <= start < end else None
 		super().__init__ ( message )
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}({self.ok!r}, {self.message!r})'
+		return f'{self._repr_prefix}({self.ok!r}, {self.message!r})'
 
 
 MultiResponseType = TypeVar ( 'MultiResponseType', bound = 'MultiResponse' )
@@ -105,26 +101,23 @@ class MultiResponse ( SuccessResponse ):
 			and lines[-1][:] == b'.\r\n'
 		), f'invalid {[bytes(line) for line in lines]=}'
 		self: MultiResponseType = cls.__new__ ( cls )
-		ok, *message = b2s ( lines[0] ).rstrip().split ( ' ', 1 )
+		ok, _, self.message = b2s ( lines[0] ).rstrip().partition ( ' ' )
 		self.ok = ( ok == '+OK' )
-		self.message = message[0] if message else ''
-		self.lines = tuple ( map ( str.strip, map ( b2s, lines[1:-1] ) ) )
+		self.lines = tuple ( [ str ( line, 'us-ascii' ).strip() for line in lines[1:-1] ] ) # one call per line, not two
 		return self
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}({self.ok!r}, {self.message!r}, {", ".join(map(repr,self.lines))})'
+		return f'{self._repr_prefix}({self.ok!r}, {self.message!r}, {", ".join(map(repr,self.lines))})'
 
 
 class CapaResponse ( MultiResponse ):
 	capa: Dict[str,str]
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
 		capa_ = ', '.join ( [
 			f'{k!r}: {v!r}' for k, v in sorted ( self.capa.items() )
 		] )
-		return f'{cls.__module__}.{cls.__name__}({self.ok!r}, {self.message!r}, capa={{{capa_}}})'
+		return f'{self._repr_prefix}({self.ok!r}, {self.message!r}, capa={{{capa_}}})'
 
 
 class StatResponse ( SuccessResponse ):
@@ -147,12 +140,13 @@ client_util = ClientUtil ( Response.parse )
 #endregion
 #region EVENTS ----------------------------------------------------------------
 
-def ResponseEvent ( ok: bool, text: str ) -> SendDataEvent:
+def _response_bytes ( ok: bool, text: str ) -> bytes:
 	ok_ = '+OK' if ok else '-ERR'
-	data = s2b (
-		f'{ok_} {text}\r\n'
-	)
-	return SendDataEvent ( data )
+	return f'{ok_} {text}\r\n'.encode ( 'us-ascii' )
+
+
+def ResponseEvent ( ok: bool, text: str ) -> SendDataEvent:
+	return SendDataEvent ( _response_bytes ( ok, text ) )
 
 
 def SuccessEvent ( text: str ) -> SendDataEvent:
@@ -168,10 +162,23 @@ def MultiResponseEvent ( text: str, *multilines: str ) -> SendDataEvent:
 	return ResponseEvent ( True, f'{text}\r\n{multilines_}\r\n.' )
 
 
+# fixed responses, pre-encoded so the server doesn't have to format them every time:
+_RESP_NO_PARAMS = _response_bytes ( False, 'No parameters allowed' ) # TODO FIXME: need RFC citation
+_RESP_TLS_ACTIVE = _response_bytes ( False, 'Command not permitted when TLS active' ) # RFC2595#4 Examples
+_RESP_MALFORMED = _response_bytes ( False, 'malformed request' )
+_RESP_NO_APOP = _response_bytes ( False, 'APOP not available' )
+_RESP_NON_ASCII = _response_bytes ( False, 'non-ASCII characters in command arguments' )
+_RESP_CLOSING = _response_bytes ( True, 'Closing connection' ) # TODO FIXME: is this correct?
+_RESP_INVALID_COMMAND = _response_bytes ( False, 'Command not recognized' )
+_RESP_TLS_REQUIRED = _response_bytes ( False, 'Command requires TLS to be active first' )
+_RESP_TLS_EXCLUDED = _response_bytes ( False, 'Command not available when TLS is active' )
+
+
 class AcceptRejectEvent ( Event ):
 	success_message: str
 	error_message: str
 	_acceptance: Opt[bool] = None
+	_flush_first = False # only the application sees these
 	
 	def __init__ ( self ) -> None:
 		self._message: str = self.error_message
@@ -182,19 +189,18 @@ class AcceptRejectEvent ( Event ):
 		self._message = self.success_message
 	
 	def reject ( self, message: Opt[str] = None ) -> None:
-		log = logger.getChild ( 'AcceptRejectEvent.reject' )
 		self._acceptance = False
 		self._message = self.error_message
 		if message is not None:
-			if not isinstance ( message, str ) or _r_eol.search ( message ):
-				log.error ( f'invalid error-{message=}' )
+			if not isinstance ( message, str ) or '\r' in message or '\n' in message:
+				logger.getChild ( 'AcceptRejectEvent.reject' ).error ( f'invalid error-{message=}' )
 			else:
 				self._message = message
 	
 	def _accepted ( self ) -> Tuple[bool,str]:
 		#log = logger.getChild ( 'AcceptRejectEvent._accepted' )
 		assert self._acceptance is not None, f'you must call .accept() or .reject() on when passed a {type(self).__module__}.{type(self).__name__} object'
-		assert isinstance ( self._message, str )
+		# _message needs no check here, accept() and reject() only ever store valid ones
 		return self._acceptance, self._message
 	
 	def go ( self ) -> Iterator[Event]:
@@ -203,12 +209,11 @@ class AcceptRejectEvent ( Event ):
 			raise ResponseEvent ( False, self._message )
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
 		args = ', '.join ( f'{k}={getattr(self,k)!r}' for k in (
 			'_acceptance',
 			'_message',
 		) )
-		return f'{cls.__module__}.{cls.__name__}({args})'
+		return f'{self._repr_prefix}({args})'
 
 
 class GreetingAcceptEvent ( AcceptRejectEvent ):
@@ -247,8 +252,7 @@ class UserPassEvent ( AcceptRejectEvent ):
 		self.pwd = pwd
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}(uid={self.uid!r})'
+		return f'{self._repr_prefix}(uid={self.uid!r})'
 
 
 def apop_hash ( challenge: str, pwd: str ) -> str:
@@ -280,8 +284,7 @@ class ApopAuthEvent ( AcceptRejectEvent ):
 		self._accept()
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}(uid={self.uid!r}, challenge={self.challenge!r})'
+		return f'{self._repr_prefix}(uid={self.uid!r}, challenge={self.challenge!r})'
 
 
 class LockMaildropEvent ( AcceptRejectEvent ):
@@ -337,7 +340,7 @@ class StatEvent ( AcceptRejectEvent ):
 class Request ( RequestT[ResponseType] ):
 	def _client_protocol ( self, client: ClientProtocol ) -> RequestProtocolGenerator:
 		assert isinstance ( client, Client )
-		yield from self.client_protocol ( client )
+		return self.client_protocol ( client )
 	
 	@abstractmethod
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
@@ -347,7 +350,7 @@ class Request ( RequestT[ResponseType] ):
 	def _server_protocol ( self, server: ServerProtocol, prefix: str, suffix: str ) -> RequestProtocolGenerator:
 		assert isinstance ( server, Server )
 		assert not prefix
-		yield from self.server_protocol ( server, suffix )
+		return self.server_protocol ( server, suffix )
 	
 	@abstractmethod
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
@@ -355,7 +358,7 @@ class Request ( RequestT[ResponseType] ):
 		raise NotImplementedError ( f'{cls.__module__}.{cls.__name__}.server_protocol()' )
 
 
-_request_verbs: Dict[str,Type[BaseRequest]] = {}
+_request_verbs: Dict[bytes,Type[BaseRequest]] = {} # keyed by encoded verb so request lines can be dispatched without decoding them
 _pop3ext_capa: Dict[str,str] = {} # TODO FIXME: implement via an event
 
 def request_verb (
@@ -366,8 +369,8 @@ def request_verb (
 	def registrar ( cls: Type[BaseRequest] ) -> Type[BaseRequest]:
 		global _request_verbs
 		assert verb == verb.upper() and ' ' not in verb and len ( verb ) <= 71, f'invalid auth mechanism {verb=}'
-		assert verb not in _request_verbs, f'duplicate request verb {verb!r}'
-		_request_verbs[verb] = cls
+		assert s2b ( verb ) not in _request_verbs, f'duplicate request verb {verb!r}'
+		_request_verbs[s2b ( verb )] = cls
 		if capa is not None:
 			capa_name, capa_params = capa
 			assert capa_name not in _pop3ext_capa, f'duplicate pop3ext {capa_name=}'
@@ -418,22 +421,22 @@ class CapaRequest ( Request[CapaResponse] ): # RFC2449
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
 		event = NeedDataEvent()
-		yield from client_util.send_recv_ok ( 'CAPA\r\n', event ) # +OK Capability list follows
-		lines: List[bytes] = [ event.data or b'' ]
+		yield from client_util.send_recv_ok ( b'CAPA\r\n', event ) # +OK Capability list follows
+		lines: List[BYTES] = [ event.data or b'' ]
 		while event.data != b'.\r\n':
 			yield from event.go()
 			lines.append ( event.data or b'' )
 		r = CapaResponse.parse_multi ( *lines )
 		r.capa = {}
 		for line in r.lines:
-			capa_name, *capa_params = line.split ( ' ', 1 )
-			r.capa[capa_name] = capa_params[0].rstrip() if capa_params else ''
+			capa_name, _, capa_params = line.partition ( ' ' )
+			r.capa[capa_name] = capa_params.rstrip()
 		raise r
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		log = logger.getChild ( 'StartTlsRequest._server_protocol' )
 		if argtext:
-			raise ErrorEvent ( 'No parameters allowed' ) # TODO FIXME: need RFC citation
+			raise SendDataEvent ( _RESP_NO_PARAMS ) # TODO FIXME: need RFC citation
 		lines = []
 		for capa_name, capa_params in _pop3ext_capa.items():
 			lines.append ( f'{capa_name} {capa_params}'.rstrip() )
@@ -448,17 +451,17 @@ class StartTlsRequest ( Request[SuccessResponse] ): # RFC2595 Using TLS with IMA
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
 		#log = logger.getChild ( 'StartTlsRequest._client_protocol' )
 		assert not client.tls
-		yield from client_util.send_recv_ok ( 'STLS\r\n' )
+		yield from client_util.send_recv_ok ( b'STLS\r\n', need_data := NeedDataEvent() )
 		yield from ( event := StartTlsBeginEvent() ).go()
 		client.tls = True
-		yield from client_util.recv_done()
+		yield from client_util.recv_done ( need_data )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		log = logger.getChild ( 'StartTlsRequest._server_protocol' )
 		if argtext:
-			raise ErrorEvent ( 'No parameters allowed' ) # TODO FIXME: need RFC citation
+			raise SendDataEvent ( _RESP_NO_PARAMS ) # TODO FIXME: need RFC citation
 		if server.tls:
-			raise ErrorEvent ( 'Command not permitted when TLS active' ) # RFC2595#4 Examples
+			raise SendDataEvent ( _RESP_TLS_ACTIVE )
 		yield from ( event1 := StartTlsAcceptEvent() ).go()
 		yield SuccessEvent ( event1._message )
 		yield from StartTlsBeginEvent().go()
@@ -508,7 +511,6 @@ class UserRequest ( Request[SuccessResponse] ):
 		#yield from plugin._server_protocol ( server, moreargtext[0] if moreargtext else '' )
 
 
-_r_apop_request = re.compile ( r'\s*([^\s]+)\s*([^\s]+)\s*' )
 @request_verb ( 'APOP' )
 class ApopRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
@@ -524,13 +526,14 @@ class ApopRequest ( Request[SuccessResponse] ):
 		yield from client_util.send_recv_done ( f'APOP {self.uid} {self.digest}\r\n' )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
-		if not ( m := _r_apop_request.match ( argtext ) ):
-			raise ErrorEvent ( 'malformed request' )
-		uid, digest = m.groups()
+		args = argtext.split()
+		if len ( args ) < 2:
+			raise SendDataEvent ( _RESP_MALFORMED )
+		uid, digest = args[:2]
 		
 		challenge = server.apop_challenge
 		if not challenge:
-			raise ErrorEvent ( 'APOP not available' )
+			raise SendDataEvent ( _RESP_NO_APOP )
 		
 		event1 = ApopAuthEvent (
 			uid = uid, challenge = challenge, digest = digest,
@@ -554,11 +557,11 @@ class RsetRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
-		yield from client_util.send_recv_done ( 'RSET\r\n' )
+		yield from client_util.send_recv_done ( b'RSET\r\n' )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		if argtext and server.pedantic: # TODO FIXME: is this correct?
-			raise ErrorEvent ( 'No parameters allowed' )
+			raise SendDataEvent ( _RESP_NO_PARAMS )
 		server.reset()
 		yield SuccessEvent ( 'TODO FIXME' )
 
@@ -568,11 +571,11 @@ class NoOpRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
-		yield from client_util.send_recv_done ( 'NOOP\r\n' )
+		yield from client_util.send_recv_done ( b'NOOP\r\n' )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		if argtext and server.pedantic: # TODO FIXME: is this correct?
-			raise ErrorEvent ( 'No parameters allowed' )
+			raise SendDataEvent ( _RESP_NO_PARAMS )
 		yield SuccessEvent ( 'TODO FIXME' )
 
 
@@ -582,19 +585,17 @@ class QuitRequest ( Request[SuccessResponse] ):
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
 		#log = logger.getChild ( 'QuitRequest._client_protocol' )
-		yield from client_util.send_recv_done ( 'QUIT\r\n' )
+		yield from client_util.send_recv_done ( b'QUIT\r\n' )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		if argtext and server.pedantic: # TODO FIXME: is this correct?
-			raise ErrorEvent ( 'No parameters allowed' )
-		yield SuccessEvent ( 'Closing connection' ) # TODO FIXME: is this correct?
+			raise SendDataEvent ( _RESP_NO_PARAMS )
+		yield SendDataEvent ( _RESP_CLOSING )
 		raise Closed ( 'QUIT' )
 
 #endregion
 #region SERVER ----------------------------------------------------------------
 
-_r_pop3_request = re.compile ( r'\s*([a-z]+)(?:\s+(.*))?\s*', re.I )
-
 class Server ( ServerProtocol ):
 	_MAXLINE = 8192
 	client_hostname: str = ''
@@ -613,26 +614,26 @@ class Server ( ServerProtocol ):
 		yield from self._run_protocol()
 	
 	def _parse_request_line ( self, line: BYTES ) -> Tuple[str,Opt[Type[BaseRequest]],str]:
-		log = logger.getChild ( 'Server._parse_request_line' )
-		m = _r_pop3_request.match ( b2s ( line ).rstrip() )
-		if not m:
-			return '', None, ''
-		verb, suffix = m.groups()
-		verb = verb.upper() # TODO FIXME: are POP3 verbs case-sensitive?
+		verb, argbytes = self._split_request_line ( line ) # RFC1939#3 keywords are case-insensitive
 		requestcls = _request_verbs.get ( verb )
 		if requestcls is None:
-			log.debug ( f'{requestcls=} {verb=} {_request_verbs=}' )
-		return '', requestcls, suffix or ''
+			log = logger.getChild ( 'Server._parse_request_line' )
+			log.debug ( f'unrecognized {verb=}' )
+			return '', None, ''
+		try:
+			return '', requestcls, argbytes.decode ( 'us-ascii' )
+		except UnicodeDecodeError:
+			raise SendDataEvent ( _RESP_NON_ASCII ) from None
 	
 	def _error_invalid_command ( self ) -> Event:
 		#log = logger.getChild ( 'Server._error_invalid_command' )
-		return ErrorEvent ( 'Command not recognized' )
+		return SendDataEvent ( _RESP_INVALID_COMMAND )
 	
 	def _error_tls_required ( self ) -> Event:
-		return ErrorEvent ( 'Command requires TLS to be active first' )
+		return SendDataEvent ( _RESP_TLS_REQUIRED )
 	
 	def _error_tls_excluded ( self ) -> Event:
-		return ErrorEvent ( 'Command not available when TLS is active' )
+		return SendDataEvent ( _RESP_TLS_EXCLUDED )
 
 
 #endregion
@@ -5,11 +5,10 @@ from __future__ import annotations
 from abc import ABCMeta, abstractmethod
 import base64
 import logging
-import re
 import traceback
 from types import TracebackType
 from typing import (
-	Callable, Dict, Generator, Iterable, Iterator, List, Optional as Opt,
+	Any, Callable, Dict, Generator, Iterable, Iterator, List, Optional as Opt,
 	Sequence as Seq, Set, Tuple, Type, TypeVar, Union,
 )
 
@@ -20,19 +19,14 @@ from base_proto import (
 	ServerProtocol,
 	ClientUtil,
 )
-from util import bytes_types, BYTES, b2s, s2b, b64_encode_str, b64_decode_str
+from util import bytes_types, BYTES, b2s, s2b, b64_encode_str
 
 logger = logging.getLogger ( __name__ )
 
-
-_r_eol = re.compile ( r'[\r\n]' )
-_r_mail_from = re.compile ( r'\s*FROM\s*:\s*<?([^>]*)>?\s*$', re.I ) # RFC5321#2.4 command verbs are not case sensitive
-_r_rcpt_to = re.compile ( r'\s*TO\s*:\s*<?([^>]*)>?\s*$', re.I ) # RFC5321#2.4 command verbs are not case sensitive
-_r_crlf_dot = re.compile ( b'\\r\\n\\.', re.M )
-
 #endregion
 #region RESPONSES -------------------------------------------------------------
 
+_ResponseT = TypeVar ( '_ResponseT', bound = 'Response' )
 class Response ( BaseResponse ):
 	def __init__ ( self, code: int, *lines: str ) -> None:
 		self.code = code
@@ -44,24 +38,43 @@ class Response ( BaseResponse ):
 	def parse ( line: BYTES ) -> Union[SuccessResponse,ErrorResponse,IntermediateResponse]:
 		#log = logger.getChild ( 'Response.parse' )
 		assert isinstance ( line, bytes_types )
+		if len ( line ) < 4:
+			raise Response._malformed ( line, ValueError ( 'truncated response' ) )
+		# hand-rolled 3-digit decode, int() is overkill here:
+		d0, d1, d2 = line[0] - 48, line[1] - 48, line[2] - 48
+		if ( d0 | d1 | d2 ) & ~0x0F or d1 > 9 or d2 > 9:
+			raise Response._malformed ( line, ValueError ( f'invalid code {bytes(line[:3])!r}' ) )
+		code = d0 * 100 + d1 * 10 + d2
+		if not 200 <= code <= 599:
+			raise Response._malformed ( line, AssertionError ( f'invalid {code=}' ) )
+		intermediate = line[3]
+		if intermediate != 32 and intermediate != 45: # b' ' or b'-'
+			raise Response._malformed ( line, AssertionError ( f'invalid {intermediate=}' ) )
 		try:
-			code = int ( line[:3] )
-			assert 200 <= code <= 599, f'invalid {code=}'
-			intermediate = line[3:4]
-			text = b2s ( line[4:] ).rstrip()
-			assert intermediate in ( b' ', b'-' )
+			text = str ( line[4:], 'us-ascii' ).rstrip() # str() decodes a memoryview without copying it first
 		except Exception as e:
-			raise Closed ( f'malformed response from server {line=}: {e=}' ) from e
-		if intermediate == b'-':
-			return IntermediateResponse ( code, text )
+			raise Response._malformed ( line, e ) from e
+		if intermediate == 45: # b'-'
+			return IntermediateResponse._trusted ( code, text )
 		if code < 400:
-			return SuccessResponse ( code, text )
+			return SuccessResponse._trusted ( code, text )
 		else:
-			return ErrorResponse ( code, text )
+			return ErrorResponse._trusted ( code, text )
+	
+	@classmethod
+	def _trusted ( cls: Type[_ResponseT], code: int, *lines: str ) -> _ResponseT:
+		# bypass __init__() validation for input that parse() has already validated
+		self = cls.__new__ ( cls )
+		self.code = code
+		self.lines = lines
+		return self
+	
+	@staticmethod
+	def _malformed ( line: BYTES, e: Exception ) -> Closed:
+		return Closed ( f'malformed response from server {line=}: {e=}' )
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}({self.code!r}, {", ".join(map(repr,self.lines))})'
+		return f'{self._repr_prefix}({self.code!r}, {", ".join(map(repr,self.lines))})'
 
 
 class SuccessResponse ( Response ):
@@ -104,14 +117,42 @@ client_util = ClientUtil ( Response.parse )
 #endregion
 #region EVENTS ----------------------------------------------------------------
 
+def _response_bytes ( code: int, *lines: str ) -> bytes:
+	if len ( lines ) == 1: # the common case
+		return f'{code} {lines[0]}\r\n'.encode ( 'us-ascii' )
+	# joining on the continuation prefix builds the whole reply in one pass:
+	sep = f'\r\n{code}-'
+	return f'{code}-{sep.join ( lines[:-1] )}\r\n{code} {lines[-1]}\r\n'.encode ( 'us-ascii' )
+
+
 def ResponseEvent ( code: int, *lines: str ) -> SendDataEvent:
-	seps = [ '-' ] * len ( lines )
-	seps[-1] = ' '
-	chunks = ( s2b ( ''.join (
-		f'{code}{sep}{line}\r\n'
-		for sep, line in zip ( seps, lines )
-	) ), )
-	return SendDataEvent ( *chunks )
+	return SendDataEvent ( _response_bytes ( code, *lines ) )
+
+
+# fixed responses, pre-encoded so the server doesn't have to format them every time:
+_RESP_NO_HOSTNAME = _response_bytes ( 501, 'missing required hostname parameter' )
+_RESP_ALREADY_HELO = _response_bytes ( 503, 'you already said HELO RFC1869#4.2' )
+_RESP_SAY_HELO = _response_bytes ( 503, 'Say HELO first' )
+_RESP_NO_EXTRA_PARAMS = _response_bytes ( 501, 'Syntax error (no extra parameters allowed)' )
+_RESP_ALREADY_AUTHENTICATED = _response_bytes ( 503, 'already authenticated (RFC4954#4 Restrictions)' )
+_RESP_AUTH_CONTINUE = _response_bytes ( 334, '' )
+_RESP_AUTH_USERNAME = _response_bytes ( 334, b64_encode_str ( 'Username:' ) )
+_RESP_AUTH_PASSWORD = _response_bytes ( 334, b64_encode_str ( 'Password:' ) )
+_RESP_MALFORMED_AUTH = _response_bytes ( 501, 'malformed auth input RFC4616#2' )
+_RESP_MUST_AUTHENTICATE = _response_bytes ( 513, 'Must authenticate' )
+_RESP_NO_MAILBOX = _response_bytes ( 501, 'missing required mailbox parameter' )
+_RESP_MALFORMED_MAIL = _response_bytes ( 501, 'malformed MAIL input' )
+_RESP_MALFORMED_RCPT = _response_bytes ( 501, 'malformed RCPT input' )
+_RESP_NO_PARAMS = _response_bytes ( 501, 'Syntax error (no parameters allowed) RFC5321#4.3.2' )
+_RESP_NON_ASCII = _response_bytes ( 501, 'Syntax error (non-ASCII parameters require SMTPUTF8) RFC6531#3.1' )
+_RESP_NO_MAIL_FROM = _response_bytes ( 503, 'no from address received yet' )
+_RESP_NO_RCPT_TO = _response_bytes ( 503, 'no rcpt address(es) received yet' )
+_RESP_START_MAIL_INPUT = _response_bytes ( 354, 'Start mail input; end with <CRLF>.<CRLF>' )
+_RESP_OK = _response_bytes ( 250, 'OK' )
+_RESP_CLOSING = _response_bytes ( 221, 'Closing connection' )
+_RESP_INVALID_COMMAND = _response_bytes ( 500, 'Command not recognized' )
+_RESP_TLS_REQUIRED = _response_bytes ( 535, 'SSL/TLS connection required' )
+_RESP_TLS_EXCLUDED = _response_bytes ( 535, 'Command not available in SSL/TLS' )
 
 
 class AcceptRejectEvent ( Event ):
@@ -119,6 +160,7 @@ class AcceptRejectEvent ( Event ):
 	success_message: str
 	error_code: int
 	error_message: str
+	_flush_first = False # only the application sees these
 	
 	def __init__ ( self ) -> None:
 		self._acceptance: Opt[bool] = None
@@ -132,26 +174,24 @@ class AcceptRejectEvent ( Event ):
 		self._message = self.success_message
 	
 	def reject ( self, code: Opt[int] = None, message: Opt[str] = None ) -> None:
-		log = logger.getChild ( 'AcceptRejectEvent.reject' )
 		self._acceptance = False
 		self._code = self.error_code
 		self._message = self.error_message
 		if code is not None:
 			if not isinstance ( code, int ) or code < 400 or code > 599:
-				log.error ( f'invalid error-{code=}' )
+				logger.getChild ( 'AcceptRejectEvent.reject' ).error ( f'invalid error-{code=}' )
 			else:
 				self._code = code
 		if message is not None:
-			if not isinstance ( message, str ) or _r_eol.search ( message ):
-				log.error ( f'invalid error-{message=}' )
+			if not isinstance ( message, str ) or '\r' in message or '\n' in message:
+				logger.getChild ( 'AcceptRejectEvent.reject' ).error ( f'invalid error-{message=}' )
 			else:
 				self._message = message
 	
 	def _accepted ( self ) -> Tuple[bool,int,str]:
 		#log = logger.getChild ( 'AcceptRejectEvent._accepted' )
 		assert self._acceptance is not None, f'you must call .accept() or .reject() on when passed a {type(self).__module__}.{type(self).__name__} object'
-		assert isinstance ( self._code, int )
-		assert isinstance ( self._message, str )
+		# _code/_message need no checks here, accept() and reject() only ever store valid ones
 		return self._acceptance, self._code, self._message
 	
 	def go ( self ) -> Iterator[Event]:
@@ -160,23 +200,32 @@ class AcceptRejectEvent ( Event ):
 			raise ResponseEvent ( self._code, self._message )
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
 		args = ', '.join ( f'{k}={getattr(self,k)!r}' for k in (
 			'_acceptance',
 			'_code',
 			'_message',
 		) )
-		return f'{cls.__module__}.{cls.__name__}({args})'
+		return f'{self._repr_prefix}({args})'
 
 
 class GreetingAcceptEvent ( AcceptRejectEvent ):
 	success_code = 220
 	error_code = 421
 	error_message = 'Too busy to accept mail right now'
+	_replies: Dict[str,bytes] = {} # default 220 reply per hostname, shared by every connection
 	
 	def __init__ ( self, server_hostname: str ) -> None:
-		self.success_message = f'{server_hostname} ESMTP'
+		self.success_message = self._default = f'{server_hostname} ESMTP'
 		super().__init__()
+	
+	def _response ( self ) -> SendDataEvent:
+		accepted, code, message = self._accepted()
+		if not accepted or code != self.success_code or message != self._default:
+			return ResponseEvent ( code, message )
+		data = self._replies.get ( message )
+		if data is None:
+			data = self._replies[message] = _response_bytes ( code, message )
+		return SendDataEvent ( data )
 
 
 class HeloAcceptEvent ( AcceptRejectEvent ):
@@ -219,8 +268,7 @@ class AuthEvent ( AcceptRejectEvent ):
 		self.pwd = pwd
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}(uid={self.uid!r})'
+		return f'{self._repr_prefix}(uid={self.uid!r})'
 
 
 class ExpnVrfyEvent ( AcceptRejectEvent ):
@@ -261,8 +309,7 @@ class MailFromEvent ( AcceptRejectEvent ):
 	# TODO FIXME: define custom reject_* methods for specific scenarios
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}(mail_from={self.mail_from!r})'
+		return f'{self._repr_prefix}(mail_from={self.mail_from!r})'
 
 
 class RcptToEvent ( AcceptRejectEvent ):
@@ -279,8 +326,7 @@ class RcptToEvent ( AcceptRejectEvent ):
 	# TODO FIXME: define custom reject_* methods for specific scenarios
 	
 	def __repr__ ( self ) -> str:
-		cls = type ( self )
-		return f'{cls.__module__}.{cls.__name__}(rcpt_to={self.rcpt_to!r})'
+		return f'{self._repr_prefix}(rcpt_to={self.rcpt_to!r})'
 
 
 class CompleteEvent ( AcceptRejectEvent ):
@@ -307,8 +353,9 @@ class CompleteEvent ( AcceptRejectEvent ):
 
 class Request ( RequestT[ResponseType] ):
 	def _client_protocol ( self, client: ClientProtocol ) -> RequestProtocolGenerator:
+		# return the subclass's generator as is, wrapping it would add a frame per event
 		assert isinstance ( client, Client )
-		yield from self.client_protocol ( client )
+		return self.client_protocol ( client )
 	
 	@classmethod
 	def subparse ( cls: Type[Request[ResponseType]],
@@ -325,7 +372,7 @@ class Request ( RequestT[ResponseType] ):
 	def _server_protocol ( self, server: ServerProtocol, prefix: str, suffix: str ) -> RequestProtocolGenerator:
 		assert isinstance ( server, Server )
 		assert not prefix
-		yield from self.server_protocol ( server, suffix )
+		return self.server_protocol ( server, suffix )
 	
 	@abstractmethod
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
@@ -333,18 +380,22 @@ class Request ( RequestT[ResponseType] ):
 		raise NotImplementedError ( f'{cls.__module__}.{cls.__name__}.server_protocol()' )
 
 
-_request_verbs: Dict[str,Type[BaseRequest]] = {}
+_SubParser = Callable[['Server',str],Tuple[Type['Request[Any]'],str]]
+_request_verbs: Dict[bytes,Tuple[Type[Request[Any]],_SubParser]] = {} # keyed by encoded verb so request lines can be dispatched without decoding them
 
-def request_verb ( verb: str ) -> Callable[[Type[BaseRequest]],Type[BaseRequest]]:
-	def registrar ( cls: Type[BaseRequest] ) -> Type[BaseRequest]:
+def request_verb ( verb: str ) -> Callable[[Type[Request[Any]]],Type[Request[Any]]]:
+	def registrar ( cls: Type[Request[Any]] ) -> Type[Request[Any]]:
 		global _request_verbs
 		assert verb == verb.upper() and ' ' not in verb and len ( verb ) <= 71, f'invalid auth mechanism {verb=}'
-		assert verb not in _request_verbs, f'duplicate request verb {verb!r}'
-		_request_verbs[verb] = cls
+		assert issubclass ( cls, Request ), f'invalid request class {cls=}'
+		key = s2b ( verb )
+		assert key not in _request_verbs, f'duplicate request verb {verb!r}'
+		_request_verbs[key] = ( cls, cls.subparse ) # pre-bound so dispatch skips the classmethod lookup
 		return cls
 	return registrar
 
 _auth_plugins: Dict[str,Type[_Auth]] = {}
+_ehlo_cache: Dict[Tuple[Tuple[Tuple[str,str],...],bool],Tuple[Dict[str,str],Set[str],bytes]] = {} # see Server._ehlo_defaults()
 
 def auth_plugin ( name: str ) -> Callable[[Type[_Auth]],Type[_Auth]]:
 	def registrar ( cls: Type[_Auth] ) -> Type[_Auth]:
@@ -352,6 +403,7 @@ def auth_plugin ( name: str ) -> Callable[[Type[_Auth]],Type[_Auth]]:
 		assert name == name.upper() and ' ' not in name and len ( name ) <= 71, f'invalid auth mechanism {name=}'
 		assert name not in _auth_plugins, f'duplicate auth mechanism {name!r}'
 		_auth_plugins[name] = cls
+		_ehlo_cache.clear() # advertised AUTH mechanisms changed
 		return cls
 	return registrar
 
@@ -374,8 +426,7 @@ class GreetingRequest ( Request[SuccessResponse] ):
 		#	(this is a useful state if remote ip is untrusted via blacklisting/whitelisting )
 		event = GreetingAcceptEvent ( server.hostname )
 		yield from event.go()
-		accepted, code, message = event._accepted()
-		yield ResponseEvent ( code, message )
+		yield event._response()
 
 
 @request_verb ( 'HELO' )
@@ -383,7 +434,7 @@ class HeloRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
 	
 	def __init__ ( self, domain: str ) -> None:
-		self.domain = str ( domain ).strip()
+		self.domain = domain.strip()
 		assert len ( self.domain ) > 0
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
@@ -393,9 +444,9 @@ class HeloRequest ( Request[SuccessResponse] ):
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		log = logger.getChild ( 'HeloRequest.server_protocol' )
 		if not argtext:
-			raise ResponseEvent ( 501, 'missing required hostname parameter' )
+			raise SendDataEvent ( _RESP_NO_HOSTNAME )
 		if server.client_hostname and server.pedantic:
-			raise ResponseEvent ( 503, 'you already said HELO RFC1869#4.2' )
+			raise SendDataEvent ( _RESP_ALREADY_HELO )
 		
 		client_hostname = argtext
 		
@@ -412,72 +463,65 @@ class HeloRequest ( Request[SuccessResponse] ):
 @request_verb ( 'EHLO' )
 class EhloRequest ( Request[EhloResponse] ):
 	responsecls = EhloResponse
+	ends_batch = True # RFC2920#3.1
 	
 	def __init__ ( self, domain: str ) -> None:
-		self.domain = str ( domain ).strip()
+		self.domain = domain.strip()
 		assert len ( self.domain ) > 0
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
-		log = logger.getChild ( 'EhloRequest.client_protocol' )
+		#log = logger.getChild ( 'EhloRequest.client_protocol' )
 		yield from client_util.send ( f'EHLO {self.domain}\r\n' )
 		event = NeedDataEvent()
 		lines: List[str] = []
 		
-		esmtp_features: Dict[str,str] = {}
-		esmtp_auth: Set[str] = set()
-		
 		while True:
-			yield from client_util.recv_ok ( event )
-			assert isinstance ( event.response, Response )
-			tmp: Opt[Response] = event.response
-			assert tmp is not None
+			# recv_ok() inlined, a big EHLO reply comes through here once per capability line
+			yield event.reset()
+			tmp = Response.parse ( event.data or b'' )
+			if not tmp.is_success():
+				raise tmp
 			lines.append ( tmp.lines[0] )
 			if isinstance ( tmp, SuccessResponse ):
+				esmtp_auth: Set[str] = set()
+				esmtp_features: Dict[str,str] = {}
 				for line in lines[1:]:
-					
-					if line.startswith ( 'AUTH ' ):
-						for auth in line.split ( ' ' )[1:]:
-							esmtp_auth.add ( auth )
+					name, sep, value = line.partition ( ' ' )
+					name = name.upper() # RFC5321#2.4 ehlo keywords are not case-sensitive
+					if sep and name == 'AUTH':
+						esmtp_auth.update ( value.split ( ' ' ) )
 					else:
-						name, *args = line.split ( ' ', 1 )
-						esmtp_features[name] = args[0] if args else ''
-				r = EhloResponse ( tmp.code, *lines )
+						esmtp_features[name] = value
+				r = EhloResponse._trusted ( tmp.code, *lines ) # every line already came through parse()
 				r.esmtp_features = esmtp_features
 				r.esmtp_auth = esmtp_auth
 				raise r
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		if not argtext:
-			raise ResponseEvent ( 501, 'missing required hostname parameter' )
+			raise SendDataEvent ( _RESP_NO_HOSTNAME )
 		if server.client_hostname and server.pedantic:
-			raise ResponseEvent ( 503, 'you already said HELO RFC1869#4.2' )
+			raise SendDataEvent ( _RESP_ALREADY_HELO )
 		
 		client_hostname = argtext
 		
+		esmtp_features, esmtp_auth, tail = server._ehlo_defaults()
+		
 		event = EhloAcceptEvent()
-		event.esmtp_features = dict ( server.esmtp_features )
-		if not server.tls:
-			event.esmtp_features['STARTTLS'] = ''
-		event.esmtp_auth = set ( [
-			name for name, plugin in _auth_plugins.items()
-			if server.tls or not plugin.tls_required
-		] )
+		event.esmtp_features = dict ( esmtp_features )
+		event.esmtp_auth = set ( esmtp_auth )
 		event.success_message = f'{server.hostname} greets {client_hostname}'
 		
 		yield from event.go()
 		
 		server.client_hostname = client_hostname
 		
-		lines: List[str] = [ event.success_message ]
-		for name, value in event.esmtp_features.items():
-			if value:
-				lines.append ( f'{name} {value}' )
-			else:
-				lines.append ( name )
-		for line in _auth_lines ( event.esmtp_auth ):
-			lines.append ( line )
-		
-		yield ResponseEvent ( 250, *lines )
+		if event.esmtp_features != esmtp_features or event.esmtp_auth != esmtp_auth: # customized by event handler
+			tail = _ehlo_tail ( event.esmtp_features, event.esmtp_auth )
+		if not tail:
+			yield ResponseEvent ( 250, event.success_message )
+		else:
+			yield SendDataEvent ( f'250-{event.success_message}\r\n'.encode ( 'us-ascii' ) + tail )
 
 
 @request_verb ( 'STARTTLS' )
@@ -487,17 +531,17 @@ class StartTlsRequest ( Request[SuccessResponse] ): # RFC3207 SMTP Service Exten
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
 		#log = logger.getChild ( 'StartTlsRequest.client_protocol' )
-		yield from client_util.send_recv_ok ( 'STARTTLS\r\n' )
+		yield from client_util.send_recv_ok ( b'STARTTLS\r\n', need_data := NeedDataEvent() )
 		yield from ( event := StartTlsBeginEvent() ).go()
 		client.tls = True
-		yield from client_util.recv_done()
+		yield from client_util.recv_done ( need_data )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		log = logger.getChild ( 'StartTlsRequest._server_protocol' )
 		if not server.client_hostname and server.pedantic:
-			raise ResponseEvent ( 503, 'Say HELO first' )
+			raise SendDataEvent ( _RESP_SAY_HELO )
 		if argtext:
-			raise ResponseEvent ( 501, 'Syntax error (no extra parameters allowed)' )
+			raise SendDataEvent ( _RESP_NO_EXTRA_PARAMS )
 		yield from ( event1 := StartTlsAcceptEvent() ).go()
 		yield ResponseEvent ( event1._code, event1._message )
 		yield from StartTlsBeginEvent().go()
@@ -508,8 +552,7 @@ class StartTlsRequest ( Request[SuccessResponse] ): # RFC3207 SMTP Service Exten
 		
 		event = GreetingAcceptEvent ( server.hostname )
 		yield from event.go()
-		accepted, code, message = event._accepted()
-		yield ResponseEvent ( code, message )
+		yield event._response()
 
 
 
@@ -519,26 +562,28 @@ class _Auth ( Request[SuccessResponse] ):
 	tls_required: bool = True
 	
 	def __init__ ( self, uid: str, pwd: str ) -> None:
-		self.uid = str ( uid )
-		self.pwd = str ( pwd )
-		assert len ( self.uid ) > 0
-		assert len ( self.pwd ) > 0
+		assert isinstance ( uid, str ) and len ( uid ) > 0, f'invalid {uid=}'
+		assert isinstance ( pwd, str ) and len ( pwd ) > 0
+		self.uid = uid
+		self.pwd = pwd
 	
 	@classmethod
 	def subparse ( cls: Type[Request[SuccessResponse]],
 		server: Server,
 		argtext: str,
 	) -> Tuple[Type[Request[SuccessResponse]],str]:
-		log = logger.getChild ( '_Auth.subparse' )
+		#log = logger.getChild ( '_Auth.subparse' )
 		if not server.client_hostname and server.pedantic:
-			raise ResponseEvent ( 503, 'Say HELO first' )
+			raise SendDataEvent ( _RESP_SAY_HELO )
 		if server.auth_uid:
-			raise ResponseEvent ( 503, 'already authenticated (RFC4954#4 Restrictions)' )
-		mechanism, *moreargtext = argtext.split ( ' ', 1 ) # ex: mechanism='PLAIN' moreargtext=['FUBAR']
+			raise SendDataEvent ( _RESP_ALREADY_AUTHENTICATED )
+		mechanism, _, moreargtext = argtext.partition ( ' ' ) # ex: mechanism='PLAIN' moreargtext='FUBAR'
+		if not mechanism.isupper(): # RFC4954#4 mechanism names are case-insensitive
+			mechanism = mechanism.upper()
 		plugincls = _auth_plugins.get ( mechanism )
 		if plugincls is None:
 			raise ResponseEvent ( 504, f'Unrecognized authentication mechanism: {mechanism}' )
-		return plugincls, moreargtext[0] if moreargtext else ''
+		return plugincls, moreargtext
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
 		return super().client_protocol ( client )
@@ -557,68 +602,85 @@ class AuthPlainRequest ( _Auth ):
 	# no _client_protocol - clients should use AuthPlain1Request or AuthPlain2Request
 	
 	def server_protocol ( self, server: Server, moreargtext: str ) -> RequestProtocolGenerator:
-		log = logger.getChild ( 'AuthPlainRequest._server_protocol' )
 		try:
-			if not ( authtext := moreargtext ):
-				yield ResponseEvent ( 334, '' )
-				yield from ( event := NeedDataEvent() ).go()
-				authtext = b2s ( event.data or b'' ).rstrip()
-			_, uid, pwd = b64_decode_str ( authtext ).split ( '\0' )
+			if moreargtext:
+				authtext = s2b ( moreargtext )
+			else:
+				yield SendDataEvent ( _RESP_AUTH_CONTINUE )
+				yield ( event := NeedDataEvent() )
+				authtext = bytes ( event.data or b'' ).rstrip()
+			_, uid_, pwd_ = base64.b64decode ( authtext, validate = True ).split ( b'\0' ) # raises: ValueError
+			uid, pwd = b2s ( uid_, 'utf-8' ), b2s ( pwd_, 'utf-8' ) # RFC4616#2 UTF8-SAFE
 		except Exception as e:
+			log = logger.getChild ( 'AuthPlainRequest._server_protocol' )
 			log.debug ( f'malformed auth input {moreargtext=}: {e=}' )
-			yield ResponseEvent ( 501, 'malformed auth input RFC4616#2' )
+			yield SendDataEvent ( _RESP_MALFORMED_AUTH )
 		else:
 			yield from self._on_authenticate ( server, uid, pwd )
 
 
 class AuthPlain1Request ( AuthPlainRequest ):
+	def __init__ ( self, uid: str, pwd: str ) -> None:
+		super().__init__ ( uid, pwd )
+		authtext = b64_encode_str ( f'{uid}\0{uid}\0{pwd}' )
+		self._line = f'AUTH PLAIN {authtext}\r\n'.encode ( 'us-ascii' )
+	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
 		#log = logger.getChild ( 'AuthPlain1Request.client_protocol' )
-		authtext = b64_encode_str ( f'{self.uid}\0{self.uid}\0{self.pwd}' )
-		yield from client_util.send_recv_done ( f'AUTH PLAIN {authtext}\r\n' )
+		yield from client_util.send_recv_done ( self._line )
 
 class AuthPlain2Request ( AuthPlainRequest ):
+	def __init__ ( self, uid: str, pwd: str ) -> None:
+		super().__init__ ( uid, pwd )
+		authtext = b64_encode_str ( f'{uid}\0{uid}\0{pwd}' )
+		self._line = f'{authtext}\r\n'.encode ( 'us-ascii' )
+	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
 		#log = logger.getChild ( 'AuthPlain2Request.client_protocol' )
-		yield from client_util.send_recv_ok ( 'AUTH PLAIN\r\n' )
-		authtext = b64_encode_str ( f'{self.uid}\0{self.uid}\0{self.pwd}' )
-		yield from client_util.send_recv_done ( f'{authtext}\r\n' )
+		yield from client_util.send_recv_ok ( b'AUTH PLAIN\r\n', event := NeedDataEvent() )
+		yield from client_util.send_recv_done ( self._line, event )
 
 
 @auth_plugin ( 'LOGIN' )
 class AuthLoginRequest ( _Auth ):
 	
+	def __init__ ( self, uid: str, pwd: str ) -> None:
+		super().__init__ ( uid, pwd )
+		self._uid_line = f'{b64_encode_str(uid)}\r\n'.encode ( 'us-ascii' )
+		self._pwd_line = f'{b64_encode_str(pwd)}\r\n'.encode ( 'us-ascii' )
+	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
 		#log = logger.getChild ( 'AuthLoginRequest.client_protocol' )
-		yield from client_util.send_recv_ok ( 'AUTH LOGIN\r\n' )
-		yield from client_util.send_recv_ok ( f'{b64_encode_str(self.uid)}\r\n' )
-		yield from client_util.send_recv_done ( f'{b64_encode_str(self.pwd)}\r\n' )
+		yield from client_util.send_recv_ok ( b'AUTH LOGIN\r\n', event := NeedDataEvent() )
+		yield from client_util.send_recv_ok ( self._uid_line, event )
+		yield from client_util.send_recv_done ( self._pwd_line, event )
 	
 	def server_protocol ( self, server: Server, moreargtext: str ) -> RequestProtocolGenerator:
-		log = logger.getChild ( 'AuthLoginRequest._server_protocol' )
 		if moreargtext and server.pedantic:
-			raise ResponseEvent ( 501, 'Syntax error (no extra parameters allowed)' )
+			raise SendDataEvent ( _RESP_NO_EXTRA_PARAMS )
 		event = NeedDataEvent()
 		try:
-			yield ResponseEvent ( 334, b64_encode_str ( 'Username:' ) )
+			yield SendDataEvent ( _RESP_AUTH_USERNAME )
 			yield event
-			uid = b2s ( base64.b64decode ( event.data or b'' ) ).rstrip()
-			yield ResponseEvent ( 334, b64_encode_str ( 'Password:' ) )
+			uid = b2s ( base64.b64decode ( bytes ( event.data or b'' ).rstrip(), validate = True ), 'utf-8' ).rstrip() # same as PLAIN
+			yield SendDataEvent ( _RESP_AUTH_PASSWORD )
 			yield event
-			pwd = b2s ( base64.b64decode ( event.data or b'' ) ).rstrip()
+			pwd = b2s ( base64.b64decode ( bytes ( event.data or b'' ).rstrip(), validate = True ), 'utf-8' ).rstrip()
 		except Exception as e:
+			log = logger.getChild ( 'AuthLoginRequest._server_protocol' )
 			log.debug ( f'{e=}' )
-			yield ResponseEvent ( 501, 'malformed auth input RFC4616#2' )
+			yield SendDataEvent ( _RESP_MALFORMED_AUTH )
 		else:
 			yield from self._on_authenticate ( server, uid, pwd )
 
 
 class ExpnVrfyRequest ( Request[ResponseType] ):
+	ends_batch = True # RFC2920#3.1
 	_verb: str
 	_event_cls: Type[ExpnVrfyEvent]
 	
 	def __init__ ( self, mailbox: str ) -> None:
-		self.mailbox = str ( mailbox ).strip()
+		self.mailbox = mailbox.strip()
 		assert len ( self.mailbox ) > 0
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
@@ -638,11 +700,11 @@ class ExpnVrfyRequest ( Request[ResponseType] ):
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator: # raises: ResponseEvent
 		if not server.client_hostname and server.pedantic:
-			raise ResponseEvent ( 503, 'Say HELO first' )
+			raise SendDataEvent ( _RESP_SAY_HELO )
 		if not server.auth_uid:
-			raise ResponseEvent ( 513, 'Must authenticate' )
+			raise SendDataEvent ( _RESP_MUST_AUTHENTICATE )
 		if not argtext:
-			raise ResponseEvent ( 501, 'missing required mailbox parameter' )
+			raise SendDataEvent ( _RESP_NO_MAILBOX )
 		event = self._event_cls ( argtext )
 		yield event
 		assert isinstance ( event._code, int )
@@ -668,12 +730,33 @@ class VrfyRequest ( ExpnVrfyRequest[VrfyResponse] ):
 	_event_cls = VrfyEvent
 
 
+def _parse_path ( argtext: str, keyword: str ) -> Opt[str]:
+	# parses 'FROM:<addr>' / 'TO:<addr>' argtext, returns None if malformed
+	s = argtext.lstrip()
+	n = len ( keyword )
+	# RFC5321#2.4 command verbs are not case sensitive, but they're almost always sent upper case:
+	if not s.startswith ( keyword ) and s[:n].upper() != keyword:
+		return None
+	s = s[n:].lstrip()
+	if s[:1] != ':':
+		return None
+	s = s[1:].lstrip()
+	if s[:1] == '<':
+		s = s[1:]
+	end = s.find ( '>' )
+	if end < 0:
+		return s
+	if s[end + 1:].strip(): # no ESMTP parameters are advertised, so nothing may follow the path
+		return None
+	return s[:end]
+
+
 @request_verb ( 'MAIL' )
 class MailFromRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
 	
 	def __init__ ( self, mail_from: str ) -> None:
-		self.mail_from = str ( mail_from ).strip()
+		self.mail_from = mail_from.strip()
 		assert len ( self.mail_from ) > 0
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
@@ -682,13 +765,12 @@ class MailFromRequest ( Request[SuccessResponse] ):
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		if not server.client_hostname and server.pedantic:
-			raise ResponseEvent ( 503, 'Say HELO first' )
+			raise SendDataEvent ( _RESP_SAY_HELO )
 		if not server.auth_uid:
-			raise ResponseEvent ( 513, 'Must authenticate' )
-		m = _r_mail_from.match ( argtext )
-		if not m:
-			raise ResponseEvent ( 501, 'malformed MAIL input' )
-		mail_from = m.group ( 1 )
+			raise SendDataEvent ( _RESP_MUST_AUTHENTICATE )
+		mail_from = _parse_path ( argtext, 'FROM' )
+		if mail_from is None:
+			raise SendDataEvent ( _RESP_MALFORMED_MAIL )
 		event = MailFromEvent ( mail_from )
 		yield event
 		accepted, code, message = event._accepted()
@@ -702,7 +784,7 @@ class RcptToRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
 	
 	def __init__ ( self, rcpt_to: str ) -> None:
-		self.rcpt_to = str ( rcpt_to ).strip()
+		self.rcpt_to = rcpt_to.strip()
 		assert len ( self.rcpt_to ) > 0
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
@@ -711,13 +793,12 @@ class RcptToRequest ( Request[SuccessResponse] ):
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		if not server.client_hostname and server.pedantic:
-			raise ResponseEvent ( 503, 'Say HELO first' )
+			raise SendDataEvent ( _RESP_SAY_HELO )
 		if not server.auth_uid:
-			raise ResponseEvent ( 513, 'Must authenticate' )
-		m = _r_rcpt_to.match ( argtext )
-		if not m:
-			raise ResponseEvent ( 501, 'malformed RCPT input' )
-		rcpt_to = m.group ( 1 )
+			raise SendDataEvent ( _RESP_MUST_AUTHENTICATE )
+		rcpt_to = _parse_path ( argtext, 'TO' )
+		if rcpt_to is None:
+			raise SendDataEvent ( _RESP_MALFORMED_RCPT )
 		event = RcptToEvent ( rcpt_to )
 		yield event
 		accepted, code, message = event._accepted()
@@ -729,58 +810,55 @@ class RcptToRequest ( Request[SuccessResponse] ):
 @request_verb ( 'DATA' )
 class DataRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
+	ends_batch = True # RFC2920#3.1
 	
 	# see RFC 5321 4.5.2 for byte stuffing algorithm description
 	
+	_coalesce_max: int = 65536 # payloads smaller than this get sent as a single chunk
+	
 	def __init__ ( self, payload: bytes ) -> None:
 		assert isinstance ( payload, bytes_types ) and len ( payload ) > 0
 		self.payload: bytes = payload # only used on client side because on server side it is accumulated in Server.data
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
-		log = logger.getChild ( 'DataRequest.client_protocol' )
-		yield from client_util.send_recv_ok ( 'DATA\r\n' )
-		payload = memoryview ( self.payload ) # avoid data copying when we start slicing it later
-		last = 0
-		stitch = b'\r\n..'
-		parts: List[bytes] = []
-		for m in _r_crlf_dot.finditer ( payload ):
-			start = m.start()
-			chunk = payload[last:start]
-			parts.append ( chunk )
-			parts.append ( stitch )
-			last = start + 3
-		if last < len ( payload ):
-			parts.append ( payload[last:] )
-		if not self.payload.endswith ( b'\r\n' ):
-			parts.append ( b'\r\n' )
-		yield from SendDataEvent ( *parts ).go()
-		yield from client_util.send_recv_done ( '.\r\n' )
+		#log = logger.getChild ( 'DataRequest.client_protocol' )
+		yield from client_util.send_recv_ok ( b'DATA\r\n', event := NeedDataEvent() )
+		# NOTE: replace() hands back the payload itself when nothing needs stuffing,
+		# so large messages send the extra dot/CRLF as separate chunks rather than getting copied again
+		payload = bytes ( self.payload ).replace ( b'\r\n.', b'\r\n..' )
+		chunks: List[bytes] = [ payload, b'.\r\n' if payload.endswith ( b'\r\n' ) else b'\r\n.\r\n' ]
+		if payload.startswith ( b'.' ): # the first line needs stuffing too
+			chunks.insert ( 0, b'.' )
+		if len ( payload ) < self._coalesce_max:
+			chunks = [ b''.join ( chunks ) ]
+		yield SendDataEvent ( *chunks )
+		yield from client_util.recv_done ( event )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		#log = logger.getChild ( 'DataRequest._server_protocol' )
 		if not server.client_hostname and server.pedantic:
-			raise ResponseEvent ( 503, 'Say HELO first' )
+			raise SendDataEvent ( _RESP_SAY_HELO )
 		if argtext and server.pedantic:
-			raise ResponseEvent ( 501, 'Syntax error (no parameters allowed) RFC5321#4.3.2' )
+			raise SendDataEvent ( _RESP_NO_PARAMS )
 		if not server.auth_uid:
-			raise ResponseEvent ( 513, 'Must authenticate' )
+			raise SendDataEvent ( _RESP_MUST_AUTHENTICATE )
 		if not server.mail_from:
-			raise ResponseEvent ( 503, 'no from address received yet' )
+			raise SendDataEvent ( _RESP_NO_MAIL_FROM )
 		if not server.rcpt_to:
-			raise ResponseEvent ( 503, 'no rcpt address(es) received yet' )
-		yield ResponseEvent ( 354, 'Start mail input; end with <CRLF>.<CRLF>' )
+			raise SendDataEvent ( _RESP_NO_RCPT_TO )
+		yield SendDataEvent ( _RESP_START_MAIL_INPUT )
 		event1 = NeedDataEvent()
-		while True:
-			yield from event1.go()
+		while True: # once per body line, so skip the go() generator
+			yield event1.reset()
 			line = event1.data or b''
-			if line == b'.\r\n':
+			if not line or line[0] != 0x2E: # b'.' - almost every body line takes this branch
+				server.data += line
+			elif line == b'.\r\n':
 				break
-			elif line[0:1] == b'.':
-				server.data.append ( line[1:] )
 			else:
-				server.data.append ( line )
-		event2 = CompleteEvent ( server.mail_from, server.rcpt_to, server.data )
-		server.reset() # is this correct? reset even if we're going to return an error?
+				server.data += line[1:]
+		event2 = CompleteEvent ( server.mail_from, server.rcpt_to, ( bytes ( server.data ), ) )
+		server.reset() # RFC5321#4.1.1.4 the buffers are cleared whether or not delivery is accepted
 		yield event2
 		_, code, message = event2._accepted()
 		yield ResponseEvent ( code, message )
@@ -791,56 +869,81 @@ class RsetRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
-		yield from client_util.send_recv_done ( 'RSET\r\n' )
+		yield from client_util.send_recv_done ( b'RSET\r\n' )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		if argtext and server.pedantic:
-			raise ResponseEvent ( 501, 'Syntax error (no parameters allowed) RFC5321#4.3.2' )
+			raise SendDataEvent ( _RESP_NO_PARAMS )
 		server.reset()
-		yield ResponseEvent ( 250, 'OK' )
+		yield SendDataEvent ( _RESP_OK )
 
 
 @request_verb ( 'NOOP' )
 class NoOpRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
+	ends_batch = True # RFC2920#3.1
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
-		yield from client_util.send_recv_done ( 'NOOP\r\n' )
+		yield from client_util.send_recv_done ( b'NOOP\r\n' )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		# FYI `argtext` is ignored per RFC 5321 4.1.1.9
-		yield ResponseEvent ( 250, 'OK' )
+		yield SendDataEvent ( _RESP_OK )
 
 
 @request_verb ( 'QUIT' )
 class QuitRequest ( Request[SuccessResponse] ):
 	responsecls = SuccessResponse
+	ends_batch = True # RFC2920#3.1
 	
 	def client_protocol ( self, client: Client ) -> RequestProtocolGenerator:
 		#log = logger.getChild ( 'QuitRequest.client_protocol' )
-		yield from client_util.send_recv_done ( 'QUIT\r\n' )
+		yield from client_util.send_recv_done ( b'QUIT\r\n' )
 	
 	def server_protocol ( self, server: Server, argtext: str ) -> RequestProtocolGenerator:
 		if argtext and server.pedantic:
-			raise ResponseEvent ( 501, 'Syntax error (no parameters allowed) RFC5321#4.3.2' )
-		yield ResponseEvent ( 221, 'Closing connection' )
+			raise SendDataEvent ( _RESP_NO_PARAMS )
+		yield SendDataEvent ( _RESP_CLOSING )
 		raise Closed ( 'QUIT' )
 
 #endregion
 #region SERVER ----------------------------------------------------------------
 
+_auth_lines_cache: Dict[Tuple[str,...],List[str]] = {}
+
 def _auth_lines ( auth_mechanisms: Iterable[str] ) -> Seq[str]:
+	key = tuple ( auth_mechanisms )
+	lines = _auth_lines_cache.get ( key )
+	if lines is None:
+		lines = _auth_lines_cache[key] = _wrap_auth_lines ( key )
+	return lines
+
+def _wrap_auth_lines ( auth_mechanisms: Seq[str] ) -> List[str]:
+	# greedily pack the names into as few AUTH lines as fit in 80 columns, in a single pass
 	lines: List[str] = []
-	if auth_mechanisms:
-		line = ' '.join ( auth_mechanisms )
-		while len ( line ) >= 71: # 80 - len ( '250-' ) - len ( 'AUTH ' )
-			n = line.rindex ( ' ', 0, 71 ) # raises: ValueError # no auth name can be 71 characters! ( not true, one of the RFCs greatly extended command length limits )
-			lines.append ( f'AUTH {line[:n]}' )
-			line = line[n:].lstrip()
-		lines.append ( f'AUTH {line}' )
+	names: List[str] = []
+	width = -1 # joined length of names
+	for name in auth_mechanisms:
+		if names and width + 1 + len ( name ) > 70: # 80 - len ( '250-' ) - len ( 'AUTH ' ) - 1
+			lines.append ( 'AUTH ' + ' '.join ( names ) )
+			names = []
+			width = -1
+		names.append ( name )
+		width += 1 + len ( name )
+	if names:
+		lines.append ( 'AUTH ' + ' '.join ( names ) )
 	return lines
 
-_r_smtp_request = re.compile ( r'^\s*([a-z]+)(?:\s+(.*))?\s*$', re.I )
+def _ehlo_tail ( esmtp_features: Dict[str,str], esmtp_auth: Iterable[str] ) -> bytes:
+	# encoded capability lines of an EHLO reply, everything after the greeting line
+	lines: List[str] = [
+		f'{name} {value}' if value else name
+		for name, value in esmtp_features.items()
+	]
+	lines.extend ( _auth_lines ( esmtp_auth ) )
+	if not lines:
+		return b''
+	return _response_bytes ( 250, *lines )
 
 
 class Server ( ServerProtocol ):
@@ -848,7 +951,7 @@ class Server ( ServerProtocol ):
 	client_hostname: str = ''
 	mail_from: str
 	rcpt_to: List[str]
-	data: List[bytes]
+	data: bytearray # message being received, handed to CompleteEvent as a single chunk
 	pedantic: bool = True # set this to False to relax behaviors that cause no harm for the protocol ( like double-HELO )
 	esmtp_features: Dict[str,str] = {
 		'8BITMIME': '', # should work out of the box?
@@ -859,46 +962,68 @@ class Server ( ServerProtocol ):
 		tls: bool,
 		hostname: str,
 	) -> None:
-		super().__init__ ( tls, hostname )
-		self.reset()
+		self.rcpt_to = []
+		self.data = bytearray()
+		super().__init__ ( tls, hostname ) # calls reset()
 	
 	def startup ( self ) -> Iterator[Event]:
+		# not a canned 220, the application may refuse the connection via GreetingAcceptEvent
 		self.request = GreetingRequest()
 		self.request_protocol = self.request.server_protocol ( self, '' )
 		yield from self._run_protocol()
 	
 	def reset ( self ) -> None:
+		# CompleteEvent takes ownership of rcpt_to, so it must be replaced rather than cleared
+		# in place, but there's no need to reallocate it if it was never used
 		self.mail_from = ''
-		self.rcpt_to = []
-		self.data = []
+		if self.rcpt_to:
+			self.rcpt_to = []
+		self.data.clear() # CompleteEvent gets a copy
+	
+	def _ehlo_defaults ( self ) -> Tuple[Dict[str,str],Set[str],bytes]:
+		# default EHLO capabilities only depend on the configured features and tls state, so build them once
+		key = ( tuple ( self.esmtp_features.items() ), self.tls )
+		defaults = _ehlo_cache.get ( key )
+		if defaults is None:
+			esmtp_features = dict ( self.esmtp_features )
+			if not self.tls:
+				esmtp_features['STARTTLS'] = ''
+			esmtp_auth = set ( [
+				name for name, plugin in _auth_plugins.items()
+				if self.tls or not plugin.tls_required
+			] )
+			defaults = _ehlo_cache[key] = (
+				esmtp_features, esmtp_auth, _ehlo_tail ( esmtp_features, esmtp_auth ),
+			)
+		return defaults
 	
 	def _parse_request_line ( self, line: BYTES ) -> Tuple[str,Opt[Type[BaseRequest]],str]:
-		log = logger.getChild ( 'Server._parse_request_line' )
-		m = _r_smtp_request.match ( b2s ( line ).rstrip() )
-		if not m:
-			#log.critical ( f'{m=} {bytes(line)=}' )
-			return '', None, ''
-		verb, suffix = m.groups()
-		verb = verb.upper() # RFC5321#2.4 command verbs are not case-sensitive
+		verb, argbytes = self._split_request_line ( line ) # RFC5321#2.4 command verbs are not case-sensitive
 		
-		requestcls = _request_verbs.get ( verb )
-		if requestcls is None:
-			log.debug ( f'{requestcls=} {verb=} {_request_verbs=}' )
-		else:
-			assert issubclass ( requestcls, Request )
-			requestcls, suffix = requestcls.subparse ( self, suffix )
+		dispatch = _request_verbs.get ( verb )
+		if dispatch is None:
+			log = logger.getChild ( 'Server._parse_request_line' )
+			log.debug ( f'unrecognized {verb=}' )
+			return '', None, ''
+		requestcls, subparse = dispatch
 		
+		# only decode the arguments once we know the verb wants them:
+		try:
+			argtext = argbytes.decode ( 'us-ascii' )
+		except UnicodeDecodeError:
+			raise SendDataEvent ( _RESP_NON_ASCII ) from None
+		requestcls, suffix = subparse ( self, argtext )
 		return '', requestcls, suffix or ''
 	
 	def _error_invalid_command ( self ) -> Event:
 		#log = logger.getChild ( 'Server._error_invalid_command' )
-		return ResponseEvent ( 500, 'Command not recognized' )
+		return SendDataEvent ( _RESP_INVALID_COMMAND )
 	
 	def _error_tls_required ( self ) -> Event:
-		return ResponseEvent ( 535, 'SSL/TLS connection required' )
+		return SendDataEvent ( _RESP_TLS_REQUIRED )
 	
 	def _error_tls_excluded ( self ) -> Event:
-		return ResponseEvent ( 535, 'Command not available in SSL/TLS' )
+		return SendDataEvent ( _RESP_TLS_EXCLUDED )
 
 #endregion
 #region CLIENT ----------------------------------------------------------------
@@ -3,7 +3,8 @@ import contextlib
 import logging
 from pathlib import Path
 import sys
-from typing import Iterator, Optional as Opt, Tuple, Type
+import types
+from typing import Iterator, List, Optional as Opt, Tuple, Type
 import unittest
 
 if __name__=='__main__': # pragma: no cover
@@ -54,9 +55,9 @@ class Tests ( unittest.TestCase ):
 		
 		class TestProtocol ( base_proto.Protocol ):
 			_MAXLINE = 42
-			def _receive_line ( self, line: bytes ) -> Iterator[base_proto.Event]:
+			def _receive_line ( self, line: BYTES ) -> Iterator[base_proto.Event]:
 				if line:
-					yield base_proto.SendDataEvent ( line )
+					yield base_proto.SendDataEvent ( bytes ( line ) )
 		tp = TestProtocol ( False )
 		evts = [ b''.join ( IsSendData ( evt ).chunks ) for evt in tp.receive ( b'foo\r' ) ]
 		test.assertEqual ( evts, [] )
@@ -75,6 +76,43 @@ class Tests ( unittest.TestCase ):
 		with test.assertRaises ( base_proto.Closed ):
 			list ( tp.receive ( b'' ) )
 		
+		# a line trickling in a piece at a time, and lines left buffered by an abandoned receive():
+		tp = TestProtocol ( False )
+		for piece in ( b'fo', b'o', b'\r', b'\nbar\r\nbaz\r\nqu' ):
+			evts = [ b''.join ( IsSendData ( evt ).chunks ) for evt in tp.receive ( piece ) ]
+			if evts:
+				break
+		test.assertEqual ( evts, [ b'foo\r\n', b'bar\r\n', b'baz\r\n' ] )
+		gen = tp.receive ( b'x\r\none\r\ntwo\r\n' )
+		assert isinstance ( gen, types.GeneratorType )
+		test.assertEqual ( b''.join ( IsSendData ( next ( gen ) ).chunks ), b'qux\r\n' )
+		gen.close()
+		evts = [ b''.join ( IsSendData ( evt ).chunks ) for evt in tp.receive ( b'three\r\n' ) ]
+		test.assertEqual ( evts, [ b'one\r\n', b'two\r\n', b'three\r\n' ] )
+		
+		# a CRLF split across reads, and bare LFs mixed in with CRLFs:
+		tp = TestProtocol ( False )
+		evts = [ b''.join ( IsSendData ( evt ).chunks ) for evt in tp.receive ( b'HELO a\r\nDATA\r' ) ]
+		test.assertEqual ( evts, [ b'HELO a\r\n' ] )
+		evts = [ b''.join ( IsSendData ( evt ).chunks ) for evt in tp.receive ( b'\nfoo\nbar\r\n' ) ]
+		test.assertEqual ( evts, [ b'DATA\r\n', b'foo\n', b'bar\r\n' ] )
+		
+		# only LF ends a line, a bare CR ( legal inside a DATA body line ) doesn't:
+		evts = [ b''.join ( IsSendData ( evt ).chunks ) for evt in TestProtocol ( False ).receive ( b'foo\rbar\r\nbaz\n' ) ]
+		test.assertEqual ( evts, [ b'foo\rbar\r\n', b'baz\n' ] )
+		
+		# ...and on that path lines are slices of one view of the read buffer, not copies of it:
+		views: List[memoryview] = []
+		class ViewProtocol ( base_proto.Protocol ):
+			_MAXLINE = 42
+			def _receive_line ( self, line: BYTES ) -> Iterator[base_proto.Event]:
+				assert isinstance ( line, memoryview )
+				views.append ( line )
+				yield from ()
+		list ( ViewProtocol ( False ).receive ( b'HELO a\r\nfoo\rbar\r\n' ) )
+		test.assertEqual ( [ bytes ( view ) for view in views ], [ b'HELO a\r\n', b'foo\rbar\r\n' ] )
+		test.assertIs ( views[0].obj, views[1].obj )
+		
 		tp = TestProtocol ( False )
 		with test.assertRaises ( base_proto.ProtocolError ):
 			list ( tp.receive ( b'X' * tp._MAXLINE ) )
@@ -104,7 +142,7 @@ class Tests ( unittest.TestCase ):
 					raise
 		
 		class BadProtocol ( base_proto.Protocol ):
-			def _receive_line ( self, line: bytes ) -> Iterator[base_proto.Event]:
+			def _receive_line ( self, line: BYTES ) -> Iterator[base_proto.Event]:
 				return super()._receive_line ( line )
 		bp = BadProtocol ( False )
 		with self.assertRaises ( NotImplementedError ):
@@ -133,6 +171,13 @@ class Tests ( unittest.TestCase ):
 			sp._error_tls_required()
 		with self.assertRaises ( NotImplementedError ):
 			sp._error_tls_excluded()
+		
+		split = base_proto.ServerProtocol._split_request_line
+		self.assertEqual ( split ( b'MAIL FROM:<a@b.c>\r\n' ), ( b'MAIL', b'FROM:<a@b.c>' ) )
+		self.assertEqual ( split ( bytearray ( b'mAiL  FROM:<a@b.c> \r\n' ) ), ( b'MAIL', b'FROM:<a@b.c>' ) )
+		self.assertEqual ( split ( b'noop\r\n' ), ( b'NOOP', b'' ) )
+		self.assertEqual ( split ( b'STARTTLS\r\n' ), ( b'STARTTLS', b'' ) )
+		self.assertEqual ( split ( b' \r\n' ), ( b'', b'' ) )
 
 if __name__ == '__main__':
 	logging.basicConfig ( level = logging.DEBUG )
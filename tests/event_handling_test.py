@@ -1,7 +1,9 @@
 # python imports:
+import asyncio
 import logging
 from pathlib import Path
 import sys
+from typing import List, cast
 import unittest
 
 if __name__ == '__main__': # pragma: no cover
@@ -9,6 +11,7 @@ if __name__ == '__main__': # pragma: no cover
 
 # email_proto imports:
 import event_handling
+import transport
 
 logger = logging.getLogger ( __name__ )
 
@@ -21,6 +24,27 @@ class Tests ( unittest.TestCase ):
 			except event_handling.Closed as e:
 				self.assertEqual ( repr ( e ), '''Closed("OSError('foo')")''' )
 				raise
+	
+	def test_write_only_transport ( self ) -> None:
+		# transports that only implement write() get each event's chunks joined into one write:
+		written: List[bytes] = []
+		class SyncWriter:
+			def write ( self, data: bytes ) -> None:
+				written.append ( data )
+		class AsyncWriter:
+			async def write ( self, data: bytes ) -> None:
+				written.append ( data )
+		event = event_handling.SendDataEvent ( b'foo\r\n', b'bar\r\n' )
+		
+		sync_handler = event_handling.SyncEventHandler()
+		sync_handler.transport = cast ( transport.SyncTransport, SyncWriter() )
+		sync_handler.on_SendDataEvent ( event )
+		
+		async_handler = event_handling.AsyncEventHandler()
+		async_handler.transport = cast ( transport.AsyncTransport, AsyncWriter() )
+		asyncio.run ( async_handler.on_SendDataEvent ( event ) )
+		
+		self.assertEqual ( written, [ b'foo\r\nbar\r\n', b'foo\r\nbar\r\n' ] )
 
 if __name__ == '__main__':
 	logging.basicConfig ( level = logging.DEBUG )
@@ -2,10 +2,11 @@
 import contextlib
 import logging
 import unittest
-from typing import Iterator
+from typing import Iterator, List
 
 # email_proto imports:
 import smtp_proto
+import util
 
 logger = logging.getLogger ( __name__ )
 
@@ -25,12 +26,21 @@ class Tests ( unittest.TestCase ):
 		log = logger.getChild ( 'Tests.test_misc' )
 		test = self
 		
+		def IsSendData ( evt: smtp_proto.Event ) -> smtp_proto.SendDataEvent:
+			assert isinstance ( evt, smtp_proto.SendDataEvent )
+			return evt
+		
 		test.assertEqual ( smtp_proto.b64_encode_str ( 'Hello' ), 'SGVsbG8=' )
-		test.assertEqual ( smtp_proto.b64_decode_str ( 'SGVsbG8=' ), 'Hello' )
+		test.assertEqual ( util.b64_decode_str ( 'SGVsbG8=' ), 'Hello' )
 		
 		evt = smtp_proto.SendDataEvent ( b'foo' )
 		test.assertEqual ( repr ( evt ), "base_proto.SendDataEvent(chunks=(b'foo',))" )
 		
+		test.assertEqual ( smtp_proto.ResponseEvent ( 250, 'OK' ).chunks, ( b'250 OK\r\n', ) )
+		test.assertEqual ( smtp_proto.ResponseEvent ( 250, 'foo', 'bar', 'baz' ).chunks, ( b'250-foo\r\n250-bar\r\n250 baz\r\n', ) )
+		with test.assertRaises ( UnicodeEncodeError ):
+			smtp_proto.ResponseEvent ( 250, 'caf\xe9' )
+		
 		# test edge cases in Connection buffer management
 		#if True:
 		#	class BrokenConnection ( smtp_proto.Connection ):
@@ -56,6 +66,14 @@ class Tests ( unittest.TestCase ):
 				)
 				raise
 		
+		# Response.parse decodes the status code by hand, make sure it still rejects garbage:
+		r = smtp_proto.Response.parse ( memoryview ( b'250-mx.example.com greets you\r\n' ) )
+		test.assertEqual ( repr ( r ), "smtp_proto.IntermediateResponse(250, 'mx.example.com greets you')" )
+		test.assertEqual ( repr ( smtp_proto.Response.parse ( b'550 no\r\n' ) ), "smtp_proto.ErrorResponse(550, 'no')" )
+		for bad in ( b'25\r\n', b'2x0 OK\r\n', b'/50 OK\r\n', b':50 OK\r\n', b'2500 OK\r\n', b'250\tOK\r\n', b'250 \xff\r\n' ):
+			with test.assertRaises ( smtp_proto.Closed ):
+				smtp_proto.Response.parse ( bad )
+		
 		if False: # the following test may no longer be valid due to client proto refactor
 			cli = smtp_proto.Client()
 			with test.assertRaises ( smtp_proto.Closed ):
@@ -126,6 +144,25 @@ class Tests ( unittest.TestCase ):
 				'AUTH consectetur, adipisci velit...',
 			]
 		)
+		# a line filled exactly to 79 columns with its '250-', and an over-long name getting a line to itself:
+		test.assertEqual ( smtp_proto._wrap_auth_lines ( [ 'A' * 35, 'B' * 34, 'C' ] ), [ f'AUTH {"A"*35} {"B"*34}', 'AUTH C' ] )
+		test.assertEqual ( smtp_proto._wrap_auth_lines ( [ 'X' * 80, 'PLAIN' ] ), [ f'AUTH {"X"*80}', 'AUTH PLAIN' ] )
+		test.assertEqual ( smtp_proto._wrap_auth_lines ( [] ), [] )
+		
+		test.assertEqual ( smtp_proto._parse_path ( ' from : <zaphod@beeblebrox.com> ', 'FROM' ), 'zaphod@beeblebrox.com' )
+		test.assertEqual ( smtp_proto._parse_path ( 'TO:ford@prefect.com', 'TO' ), 'ford@prefect.com' )
+		test.assertEqual ( smtp_proto._parse_path ( 'FROM:<>', 'FROM' ), '' )
+		test.assertIsNone ( smtp_proto._parse_path ( 'TOO:<ford@prefect.com>', 'TO' ) )
+		# either angle bracket may be missing, but nothing may follow the path:
+		test.assertEqual ( smtp_proto._parse_path ( 'FROM:<zaphod', 'FROM' ), 'zaphod' )
+		test.assertEqual ( smtp_proto._parse_path ( 'TO:ford@prefect.com>', 'TO' ), 'ford@prefect.com' )
+		test.assertIsNone ( smtp_proto._parse_path ( ' from : <zaphod@beeblebrox.com> SIZE=42', 'FROM' ) )
+		test.assertIsNone ( smtp_proto._parse_path ( 'TO:<ford@prefect.com>>', 'TO' ) )
+		
+		# the hostname goes out in the greeting, so it can't smuggle in extra lines:
+		for hostname in ( 'mx.example.com\r\n250 OK', 'mx\nexample', 'mx\0' ):
+			with test.assertRaises ( ValueError ):
+				smtp_proto.Server ( False, hostname )
 		
 		# trigger exception handler in _run_protocol:
 		srv = smtp_proto.Server ( False, 'localhost' )
@@ -176,6 +213,208 @@ class Tests ( unittest.TestCase ):
 		
 		ir = smtp_proto.IntermediateResponse ( 200, 'foo' )
 		test.assertTrue ( ir.is_success() )
+		
+		def ehlo_reply ( srv: smtp_proto.Server, customize: bool = False ) -> bytes:
+			chunks: List[bytes] = []
+			for event in srv.receive ( b'EHLO foo\r\n' ):
+				if isinstance ( event, smtp_proto.EhloAcceptEvent ):
+					if customize:
+						event.esmtp_features['FOO'] = 'BAR'
+					event.accept()
+				else:
+					assert isinstance ( event, smtp_proto.SendDataEvent )
+					chunks.extend ( event.chunks )
+			return b''.join ( chunks )
+		
+		# EHLO reply uses cached capability lines unless the event handler customizes them:
+		for customize, expected in (
+			( False, b'250-localhost greets foo\r\n250-8BITMIME\r\n250-PIPELINING\r\n250 STARTTLS\r\n' ),
+			( True, b'250-localhost greets foo\r\n250-8BITMIME\r\n250-PIPELINING\r\n250-STARTTLS\r\n250 FOO BAR\r\n' ),
+			( False, b'250-localhost greets foo\r\n250-8BITMIME\r\n250-PIPELINING\r\n250 STARTTLS\r\n' ),
+		):
+			test.assertEqual ( ehlo_reply ( smtp_proto.Server ( False, 'localhost' ), customize ), expected )
+		
+		# ...but the cache follows each server's own feature list, not just its class:
+		srv1 = smtp_proto.Server ( False, 'localhost' )
+		srv1.esmtp_features = { 'SIZE': '1000' }
+		srv2 = smtp_proto.Server ( False, 'localhost' )
+		test.assertEqual ( ehlo_reply ( srv1 ), b'250-localhost greets foo\r\n250-SIZE 1000\r\n250 STARTTLS\r\n' )
+		test.assertEqual ( ehlo_reply ( srv2 ), b'250-localhost greets foo\r\n250-8BITMIME\r\n250-PIPELINING\r\n250 STARTTLS\r\n' )
+		
+		# the 220 greeting is encoded once for every connection, and follows a hostname changed after construction:
+		def greeting ( srv: smtp_proto.Server ) -> bytes:
+			chunks: List[bytes] = []
+			for event in srv.startup():
+				if isinstance ( event, smtp_proto.GreetingAcceptEvent ):
+					event.accept()
+				else:
+					chunks.extend ( IsSendData ( event ).chunks )
+			test.assertEqual ( len ( chunks ), 1 )
+			return chunks[0]
+		srv = smtp_proto.Server ( False, 'localhost' )
+		reply = greeting ( srv )
+		test.assertEqual ( reply, b'220 localhost ESMTP\r\n' )
+		test.assertIs ( greeting ( smtp_proto.Server ( False, 'localhost' ) ), reply )
+		srv.hostname = 'mail.example.com'
+		test.assertEqual ( greeting ( srv ), b'220 mail.example.com ESMTP\r\n' )
+		
+		# AUTH lines may repeat:
+		cli = smtp_proto.Client ( False )
+		ehlo = smtp_proto.EhloRequest ( 'foo' )
+		list ( cli.send ( ehlo ) )
+		list ( cli.receive ( b'250-localhost greets foo\r\n250-PIPELINING\r\n250-SIZE 1000\r\n250-AUTH LOGIN\r\n250 AUTH PLAIN\r\n' ) )
+		assert isinstance ( ehlo.base_response, smtp_proto.EhloResponse )
+		test.assertEqual ( ehlo.base_response.esmtp_features, { 'PIPELINING': '', 'SIZE': '1000' } )
+		test.assertEqual ( ehlo.base_response.esmtp_auth, { 'LOGIN', 'PLAIN' } )
+		
+		# RFC 5321 2.4 EHLO keywords are case-insensitive, so they're reported upper-cased:
+		cli = smtp_proto.Client ( False )
+		ehlo = smtp_proto.EhloRequest ( 'foo' )
+		list ( cli.send ( ehlo ) )
+		list ( cli.receive ( b'250-localhost greets foo\r\n250-8bitmime\r\n250-Size 1000\r\n250 auth LOGIN\r\n' ) )
+		assert isinstance ( ehlo.base_response, smtp_proto.EhloResponse )
+		test.assertEqual ( ehlo.base_response.esmtp_features, { '8BITMIME': '', 'SIZE': '1000' } )
+		test.assertEqual ( ehlo.base_response.esmtp_auth, { 'LOGIN' } )
+		
+		# 8-bit command arguments get a syntax error instead of blowing up the decode:
+		srv = smtp_proto.Server ( False, 'localhost' )
+		evts = list ( srv.receive ( 'HELO f\u00fc\r\n'.encode ( 'utf-8' ) ) )
+		test.assertEqual ( [ IsSendData ( evt ).chunks for evt in evts ], [
+			( b'501 Syntax error (non-ASCII parameters require SMTPUTF8) RFC6531#3.1\r\n', ),
+		] )
+		
+		# the server reuses its DATA buffer, so each CompleteEvent must keep its own message:
+		srv = smtp_proto.Server ( False, 'localhost' )
+		srv.client_hostname = 'foo'
+		srv.auth_uid = 'zaphod'
+		completed: List[smtp_proto.CompleteEvent] = []
+		for body in ( b'.first\r\n', b'second\r\n' ):
+			for event in srv.receive ( b'MAIL FROM:<a@b.c>\r\nRCPT TO:<d@e.f>\r\nDATA\r\n' + body + b'.\r\n' ):
+				if isinstance ( event, smtp_proto.AcceptRejectEvent ):
+					event.accept()
+					if isinstance ( event, smtp_proto.CompleteEvent ):
+						completed.append ( event )
+		test.assertEqual ( [ ( evt.rcpt_to, evt.data ) for evt in completed ], [
+			( [ 'd@e.f' ], ( b'first\r\n', ) ),
+			( [ 'd@e.f' ], ( b'second\r\n', ) ),
+		] )
+		test.assertIsNot ( completed[0].rcpt_to, completed[1].rcpt_to )
+		test.assertIs ( type ( completed[0].data[0] ), bytes )
+		
+		# ...and the transaction is over even if the application rejects the message:
+		evts = []
+		for event in srv.receive ( b'MAIL FROM:<a@b.c>\r\nRCPT TO:<d@e.f>\r\nDATA\r\nbody\r\n.\r\nDATA\r\n' ):
+			if isinstance ( event, smtp_proto.CompleteEvent ):
+				event.reject()
+			elif isinstance ( event, smtp_proto.AcceptRejectEvent ):
+				event.accept()
+			else:
+				evts.append ( event )
+		test.assertEqual ( ( srv.mail_from, srv.rcpt_to, srv.data ), ( '', [], bytearray() ) )
+		test.assertEqual ( [ IsSendData ( evt ).chunks for evt in evts ], [
+			( b'250 OK\r\n250 OK\r\n', ),
+			( b'354 Start mail input; end with <CRLF>.<CRLF>\r\n', ),
+			( b'450 Unable to accept message for delivery\r\n', ),
+			( b'503 no from address received yet\r\n', ),
+		] )
+		
+		# MAIL FROM parameters aren't accepted since none are advertised, a stray '>' is tolerated:
+		srv = smtp_proto.Server ( False, 'localhost' )
+		srv.client_hostname = 'foo'
+		srv.auth_uid = 'zaphod'
+		evts = list ( srv.receive ( b'MAIL FROM:<a@b.c> SIZE=100\r\n' ) )
+		test.assertEqual ( [ IsSendData ( evt ).chunks for evt in evts ], [ ( b'501 malformed MAIL input\r\n', ) ] )
+		for event in srv.receive ( b'MAIL FROM:a@b.c>\r\n' ):
+			if isinstance ( event, smtp_proto.MailFromEvent ):
+				event.accept()
+		test.assertEqual ( srv.mail_from, 'a@b.c' )
+		
+		# RFC 4954 4 auth mechanism names are case-insensitive:
+		srv = smtp_proto.Server ( True, 'localhost' )
+		for event in srv.receive ( b'HELO foo\r\n' ):
+			if isinstance ( event, smtp_proto.AcceptRejectEvent ):
+				event.accept()
+		evts = []
+		for event in srv.receive ( b'auth Plain AHphcGhvZABwdw==\r\n' ):
+			if isinstance ( event, smtp_proto.AuthEvent ):
+				test.assertEqual ( event.uid, 'zaphod' )
+				event.accept()
+			evts.append ( event )
+		test.assertEqual ( [ type ( evt ) for evt in evts ], [ smtp_proto.AuthEvent, smtp_proto.SendDataEvent ] )
+		test.assertEqual ( srv.auth_uid, 'zaphod' )
+		
+		# PLAIN and LOGIN agree that base64 with stray characters in it is malformed:
+		for lines in (
+			[ b'AUTH PLAIN AHphcGhv*ZABwdw==\r\n' ],
+			[ b'AUTH LOGIN\r\n', b'emFw*aG9k\r\n' ],
+			[ b'AUTH LOGIN\r\n', b'emFwaG9k\r\n', b'cH*c=\r\n' ],
+		):
+			srv = smtp_proto.Server ( True, 'localhost' )
+			srv.client_hostname = 'foo'
+			evts = [ event for line in lines for event in srv.receive ( line ) ]
+			test.assertEqual ( IsSendData ( evts[-1] ).chunks, ( b'501 malformed auth input RFC4616#2\r\n', ) )
+		
+		# RFC 2920 3.1 replies to NOOP, QUIT, unknown verbs etc end a group and go out right away:
+		srv = smtp_proto.Server ( False, 'localhost' )
+		evts = list ( srv.receive ( b'NOOP\r\nNOOP\r\nFUBAR\r\n' ) )
+		test.assertEqual ( [ IsSendData ( evt ).chunks for evt in evts ], [
+			( b'250 OK\r\n', ),
+			( b'250 OK\r\n', ),
+			( b'500 Command not recognized\r\n', ),
+		] )
+		with test.assertRaises ( smtp_proto.Closed ):
+			evts = []
+			try:
+				for event in srv.receive ( b'NOOP\r\nQUIT\r\n' ):
+					evts.append ( event )
+			finally: # the QUIT response still goes out
+				test.assertEqual ( [ IsSendData ( evt ).chunks for evt in evts ], [
+					( b'250 OK\r\n', ),
+					( b'221 Closing connection\r\n', ),
+				] )
+		
+		# ...while the rest get coalesced into a single write, even across the accept/reject events
+		# the application gets asked about:
+		srv = smtp_proto.Server ( False, 'localhost' )
+		srv.client_hostname = 'foo'
+		srv.auth_uid = 'zaphod'
+		evts = []
+		for event in srv.receive ( b'MAIL FROM:<a@b.c>\r\nRCPT TO:<d@e.f>\r\nRCPT TO:<g@h.i>\r\nDATA\r\n' ):
+			if isinstance ( event, smtp_proto.AcceptRejectEvent ):
+				event.accept()
+			else:
+				evts.append ( event )
+		test.assertEqual ( [ IsSendData ( evt ).chunks for evt in evts ], [
+			( b'250 OK\r\n250 OK\r\n250 OK\r\n', ),
+			( b'354 Start mail input; end with <CRLF>.<CRLF>\r\n', ),
+		] )
+		
+		# RFC 5321 4.5.2 dot-stuffing, including a leading dot on the first line:
+		cli = smtp_proto.Client ( False )
+		evts = list ( cli.send ( smtp_proto.DataRequest ( b'.foo\r\n.bar\r\nbaz' ) ) )
+		test.assertEqual ( [ b''.join ( IsSendData ( evt ).chunks ) for evt in evts ], [ b'DATA\r\n' ] )
+		evts = list ( cli.receive ( b'354 Start mail input\r\n' ) )
+		test.assertEqual ( [ b''.join ( IsSendData ( evt ).chunks ) for evt in evts ], [
+			b'..foo\r\n..bar\r\nbaz\r\n.\r\n',
+		] )
+		cli = smtp_proto.Client ( False )
+		request = smtp_proto.DataRequest ( b'.foo\r\n.bar\r\nbaz' )
+		request._coalesce_max = 0 # large payloads don't get copied again
+		list ( cli.send ( request ) )
+		evts = list ( cli.receive ( b'354 Start mail input\r\n' ) )
+		test.assertEqual ( [ IsSendData ( evt ).chunks for evt in evts ], [
+			( b'.', b'.foo\r\n..bar\r\nbaz', b'\r\n.\r\n' ),
+		] )
+		# and with nothing to stuff, the payload goes out as the very same object:
+		cli = smtp_proto.Client ( False )
+		payload = b'foo\r\nbar\r\n'
+		request = smtp_proto.DataRequest ( payload )
+		request._coalesce_max = 0
+		list ( cli.send ( request ) )
+		evts = list ( cli.receive ( b'354 Start mail input\r\n' ) )
+		chunks = IsSendData ( evts[0] ).chunks
+		test.assertIs ( chunks[0], payload )
+		test.assertEqual ( chunks[1:], ( b'.\r\n', ) )
 
 if __name__ == '__main__':
 	logging.basicConfig ( level = logging.DEBUG )
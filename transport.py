@@ -3,7 +3,7 @@ from abc import ABCMeta, abstractmethod
 import logging
 import ssl
 import sys
-from typing import Optional as Opt
+from typing import Optional as Opt, Sequence as Seq
 
 # email_proto imports:
 from util import BYTES
@@ -37,6 +37,11 @@ class SyncTransport ( Transport ):
 		cls = type ( self )
 		raise NotImplementedError ( f'{cls.__module__}.{cls.__name__}.write()' )
 	
+	def writelines ( self, chunks: Seq[BYTES] ) -> None:
+		# override this if the transport can send several buffers without joining them first
+		for chunk in chunks:
+			self.write ( chunk )
+	
 	@abstractmethod
 	def starttls_client ( self, server_hostname: str ) -> None:
 		cls = type ( self )
@@ -64,6 +69,11 @@ class AsyncTransport ( Transport ):
 		cls = type ( self )
 		raise NotImplementedError ( f'{cls.__module__}.{cls.__name__}.write()' )
 	
+	async def writelines ( self, chunks: Seq[BYTES] ) -> None:
+		# override this if the transport can send several buffers without joining them first
+		for chunk in chunks:
+			await self.write ( chunk )
+	
 	@abstractmethod
 	async def starttls_client ( self, server_hostname: str ) -> None:
 		cls = type ( self )
@@ -5,10 +5,11 @@ import asyncio
 import contextlib
 import logging
 import ssl
-from typing import Iterator, Type
+from typing import Iterator, Sequence as Seq, Type
 
 # email_proto imports:
 from transport import AsyncTransport
+from util import BYTES
 
 logger = logging.getLogger ( __name__ )
 
@@ -24,6 +25,7 @@ def asyncio_timeout ( self: object, text: str ) -> Iterator[None]:
 class AsyncioTransport ( AsyncTransport ):
 	rx: asyncio.StreamReader
 	tx: asyncio.StreamWriter
+	read_size: int = 65536 # upper bound on what a single read() hands to the protocol
 	
 	def __init__ ( self, rx: asyncio.StreamReader, tx: asyncio.StreamWriter ) -> None:
 		self.rx, self.tx = rx, tx
@@ -44,7 +46,7 @@ class AsyncioTransport ( AsyncTransport ):
 		#log = logger.getChild ( 'AsyncioTransport.read' )
 		with asyncio_timeout ( self, 'waiting to read data' ):
 			return await asyncio.wait_for (
-				self.rx.readline(), # NOTE: there doesn't seem to be a way to tell asyncio to give us everything it has...
+				self.rx.read ( self.read_size ), # everything already buffered, not just one line
 				timeout = 1.0, # TODO FIXME: configurable timeout (this value is only for testing) and better error handling
 			)
 	
@@ -57,6 +59,15 @@ class AsyncioTransport ( AsyncTransport ):
 				timeout = 1.0, # TODO FIXME: configurable timeout (this value is only for testing) and better error handling
 			)
 	
+	async def writelines ( self, chunks: Seq[BYTES] ) -> None:
+		#log = logger.getChild ( 'AsyncioTransport.writelines' )
+		self.tx.writelines ( chunks ) # queue them all, then wait for a single drain
+		with asyncio_timeout ( self, 'waiting to write data' ):
+			return await asyncio.wait_for (
+				self.tx.drain(),
+				timeout = 1.0, # TODO FIXME: configurable timeout (this value is only for testing) and better error handling
+			)
+	
 	async def starttls_client ( self, server_hostname: str ) -> None:
 		context = self.ssl_context_or_default_client()
 		
@@ -14,6 +14,7 @@ logger = logging.getLogger ( __name__ )
 
 class SocketTransport ( SyncTransport ):
 	sock: socket.socket
+	read_size: int = 65536 # bigger reads mean fewer recv() calls during DATA
 	
 	def __init__ ( self, sock: socket.socket ) -> None:
 		self.sock = sock
@@ -39,7 +40,7 @@ class SocketTransport ( SyncTransport ):
 	
 	def read ( self ) -> bytes:
 		#log = logger.getChild ( 'SocketTransport.read' )
-		return self.sock.recv ( 4096 )
+		return self.sock.recv ( self.read_size )
 	
 	def write ( self, data: bytes ) -> None:
 		#log = logger.getChild ( 'SocketTransport.write' )
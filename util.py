@@ -1,17 +1,20 @@
-import base64
+import binascii
 from typing import Union
 
 BYTES = Union[bytes,bytearray,memoryview]
 bytes_types = ( bytes, bytearray, memoryview )
 
 def b2s ( b: BYTES, encoding: str = 'us-ascii', errors: str = 'strict' ) -> str:
-	return bytes ( b ).decode ( encoding, errors )
+	return str ( b, encoding, errors ) # decodes straight from the buffer, no bytes() copy first
 
 def s2b ( s: str, encoding: str = 'us-ascii', errors: str = 'strict' ) -> bytes:
 	return s.encode ( encoding, errors )
 
+# binascii directly: base64.b64encode/b64decode are python wrappers around these
+# that cost more than the conversion itself on AUTH-sized input
+
 def b64_encode_str ( s: str ) -> str:
-	return b2s ( base64.b64encode ( s2b ( s ) ) )
+	return b2s ( binascii.b2a_base64 ( s2b ( s ), newline = False ) )
 
 def b64_decode_str ( s: str ) -> str:
-	return b2s ( base64.b64decode ( s2b ( s ) ) )
+	return b2s ( binascii.a2b_base64 ( s2b ( s ) ) )